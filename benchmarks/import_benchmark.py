@@ -0,0 +1,100 @@
+"""Import time of the lib facade against importing every construct module.
+
+Each scenario runs in a fresh interpreter and reports the wall time of the
+import and the number of jsii assemblies it loaded.
+
+    python benchmarks/import_benchmark.py
+    python benchmarks/import_benchmark.py --constructs QueueConstruct
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+
+CONSTRUCTS = [
+    "QueueConstruct",
+    "LambdaConstruct",
+    "DbConstruct",
+    "ApiLambdaIntegationRestConstruct",
+    "S3StaticSiteConstruct",
+    "CloudwatchDashboardConstruct",
+]
+EAGER_MODULES = [
+    "lib.lambda_construct",
+    "lib.db_construct",
+    "lib.queue_construct",
+    "lib.apigw_lambda_integration_rest_construct",
+    "lib.s3staticsite_construct",
+    "lib.cloudwatchdashboard_construct",
+]
+
+
+def run_scenario(scenario: str) -> dict:
+    import importlib
+    from jsii._kernel import Kernel
+
+    loads = []
+    load = Kernel.load
+
+    def counting_load(self, name, version, tarball):
+        loads.append(name)
+        return load(self, name, version, tarball)
+
+    Kernel.load = counting_load
+    sys.path.insert(0, REPO_DIR)
+
+    started = time.perf_counter()
+    if scenario == "eager":
+        for module in EAGER_MODULES:
+            importlib.import_module(module)
+    else:
+        getattr(importlib.import_module("lib"), scenario)
+    import_s = time.perf_counter() - started
+
+    return {"import_s": round(import_s, 3), "assemblies": len(loads)}
+
+
+def measure(scenario: str, repeat: int) -> dict:
+    runs = []
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable,
+             os.path.abspath(__file__), "--run", scenario],
+            check=True,
+            stdout=subprocess.PIPE,
+            cwd=REPO_DIR,
+        ).stdout
+        runs.append(json.loads(output.decode("utf-8").splitlines()[-1]))
+    return {metric: min(run[metric] for run in runs) for metric in runs[0]}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--constructs", nargs="*", default=CONSTRUCTS)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--run", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        print(json.dumps(run_scenario(args.run)))
+        return 0
+
+    eager = measure("eager", args.repeat)
+    print(f"{'scenario':<36}{'import_s':>10}{'assemblies':>12}{'saved':>8}")
+    print(f"{'eager, every construct module':<36}{eager['import_s']:>10}"
+          f"{eager['assemblies']:>12}{'':>8}")
+    for construct in args.constructs:
+        lazy = measure(construct, args.repeat)
+        saved = 1 - lazy["import_s"] / eager["import_s"]
+        print(f"{'lib.' + construct:<36}{lazy['import_s']:>10}"
+              f"{lazy['assemblies']:>12}{saved:>8.0%}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,272 @@
+"""Synthesis benchmarks for the constructs under lib/.
+
+Every case runs in a fresh interpreter so jsii startup, peak RSS and the
+jsii call count belong to that case alone. Nothing is deployed and no
+context lookups are made, so the suite runs offline.
+
+    python benchmarks/synth_benchmark.py                    # compare
+    python benchmarks/synth_benchmark.py --update-baselines # record
+    python benchmarks/synth_benchmark.py --cases lambda:10 composite:1
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+CONTEXT_PATH = os.path.join(BENCH_DIR, "context.json")
+BASELINES_PATH = os.path.join(BENCH_DIR, "baselines.json")
+
+CONSTRUCTS = ["lambda", "db", "queue", "api", "site", "dashboard", "composite"]
+SCALES = [1, 10, 50]
+# Keeps the composite case under the 500 resources per stack limit
+INSTANCES_PER_STACK = 5
+
+# Allowed relative growth over the baseline before a case fails
+TOLERANCES = {
+    "import_s": 0.30,
+    "synth_s": 0.30,
+    "jsii_calls": 0.05,
+    "peak_rss_kb": 0.20,
+    "template_bytes": 0.02,
+}
+# Absolute slack on timings so sub-second cases do not fail on noise
+TIME_SLACK_S = 0.1
+
+
+###
+# Case side, runs inside the child interpreter
+###
+
+
+def count_jsii_calls():
+    from jsii._kernel.providers import process
+
+    stats = {"calls": 0, "node": None}
+    send = process._NodeProcess.send
+
+    def counting_send(self, request, response_type):
+        stats["calls"] += 1
+        stats["node"] = self._process
+        return send(self, request, response_type)
+
+    process._NodeProcess.send = counting_send
+    return stats
+
+
+def node_peak_rss_kb(node) -> int:
+    try:
+        with open(f"/proc/{node.pid}/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except (OSError, AttributeError):
+        pass
+    return 0
+
+
+def import_constructs() -> None:
+    global core, LambdaConstruct, DbConstruct, QueueConstruct, \
+        ApiLambdaIntegationRestConstruct, S3StaticSiteConstruct, \
+        CloudwatchDashboardConstruct
+    from aws_cdk import core
+    from lib.lambda_construct import LambdaConstruct
+    from lib.db_construct import DbConstruct
+    from lib.queue_construct import QueueConstruct
+    from lib.apigw_lambda_integration_rest_construct import \
+        ApiLambdaIntegationRestConstruct
+    from lib.s3staticsite_construct import S3StaticSiteConstruct
+    from lib.cloudwatchdashboard_construct import CloudwatchDashboardConstruct
+
+
+def build_case(app, construct: str, scale: int) -> None:
+    for idx in range(scale):
+        if idx % INSTANCES_PER_STACK == 0:
+            stack = core.Stack(app, f"Bench{idx // INSTANCES_PER_STACK}")
+
+        if construct == "queue":
+            QueueConstruct(stack, f"Queue{idx}", queue_context="queue")
+            continue
+        if construct == "site":
+            S3StaticSiteConstruct(stack, f"Site{idx}", ss_context="site")
+            continue
+        if construct == "db":
+            DbConstruct(stack, f"Db{idx}", db_context="db")
+            continue
+
+        fn = LambdaConstruct(stack, f"Fn{idx}", lambda_context="lambda")
+        if construct == "lambda":
+            continue
+
+        api = ApiLambdaIntegationRestConstruct(
+            stack,
+            f"Api{idx}",
+            stage="bench",
+            lambda_fn_alias=fn.main_function_alias,
+            gw_context="gateway")
+        if construct == "api":
+            continue
+
+        db = DbConstruct(stack, f"Db{idx}", db_context="db")
+        CloudwatchDashboardConstruct(stack,
+                                     f"Dashboard{idx}",
+                                     stage="bench",
+                                     api=api.main_api,
+                                     fn=fn.main_function,
+                                     table=db.main_table,
+                                     fn_config=fn.main_function_config)
+        if construct == "dashboard":
+            continue
+
+        QueueConstruct(stack,
+                       f"Queue{idx}",
+                       queue_context="queue",
+                       consumer_fn=fn.main_function_alias,
+                       consumer_fn_timeout=fn.main_function_timeout)
+        S3StaticSiteConstruct(stack, f"Site{idx}", ss_context="site")
+
+
+def run_case(construct: str, scale: int) -> dict:
+    import resource
+
+    jsii_stats = count_jsii_calls()
+    sys.path.insert(0, REPO_DIR)
+
+    started = time.perf_counter()
+    import_constructs()
+    import_s = time.perf_counter() - started
+
+    with open(CONTEXT_PATH) as f:
+        context = json.load(f)
+    context["lambda"]["fn_path"] = os.path.join(BENCH_DIR,
+                                                context["lambda"]["fn_path"])
+
+    with tempfile.TemporaryDirectory() as outdir:
+        calls_before = jsii_stats["calls"]
+        started = time.perf_counter()
+
+        app = core.App(context=context, outdir=outdir)
+        build_case(app, construct, scale)
+        assembly = app.synth()
+
+        synth_s = time.perf_counter() - started
+        jsii_calls = jsii_stats["calls"] - calls_before
+        template_bytes = sum(
+            len(json.dumps(stack.template)) for stack in assembly.stacks)
+
+    python_rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {
+        "import_s": round(import_s, 3),
+        "synth_s": round(synth_s, 3),
+        "jsii_calls": jsii_calls,
+        "peak_rss_kb": python_rss_kb + node_peak_rss_kb(jsii_stats["node"]),
+        "template_bytes": template_bytes,
+    }
+
+
+###
+# Driver side
+###
+
+
+def measure(case: str, repeat: int) -> dict:
+    runs = []
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--run-case", case],
+            check=True,
+            stdout=subprocess.PIPE,
+            cwd=REPO_DIR,
+        ).stdout
+        runs.append(json.loads(output.decode("utf-8").splitlines()[-1]))
+
+    # Best of the repeats for timings, jsii calls and sizes are stable
+    return {
+        metric: min(run[metric] for run in runs)
+        for metric in runs[0]
+    }
+
+
+def compare(case: str, result: dict, baseline: dict,
+            tolerances: dict) -> list:
+    regressions = []
+    for metric, tolerance in tolerances.items():
+        if metric not in baseline:
+            continue
+        limit = baseline[metric] * (1 + tolerance)
+        if metric.endswith("_s"):
+            limit = max(limit, baseline[metric] + TIME_SLACK_S)
+        if result[metric] > limit:
+            regressions.append(
+                f"{case} {metric}: {result[metric]} > {baseline[metric]} "
+                f"(+{tolerance:.0%} allowed)")
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cases",
+                        nargs="*",
+                        help="construct:scale pairs, defaults to every "
+                        "construct at every scale")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--update-baselines", action="store_true")
+    parser.add_argument("--tolerance",
+                        action="append",
+                        default=[],
+                        metavar="METRIC=FRACTION")
+    parser.add_argument("--run-case", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_case:
+        construct, scale = args.run_case.split(":")
+        print(json.dumps(run_case(construct, int(scale))))
+        return 0
+
+    tolerances = dict(TOLERANCES)
+    for override in args.tolerance:
+        metric, fraction = override.split("=")
+        tolerances[metric] = float(fraction)
+
+    cases = args.cases or [
+        f"{construct}:{scale}" for construct in CONSTRUCTS
+        for scale in SCALES
+    ]
+
+    baselines = {}
+    if os.path.exists(BASELINES_PATH):
+        with open(BASELINES_PATH) as f:
+            baselines = json.load(f)
+
+    regressions = []
+    print(f"{'case':<16}{'import_s':>10}{'synth_s':>10}{'jsii_calls':>12}"
+          f"{'peak_rss_kb':>13}{'template_bytes':>16}")
+    for case in cases:
+        result = measure(case, args.repeat)
+        print(f"{case:<16}{result['import_s']:>10}{result['synth_s']:>10}"
+              f"{result['jsii_calls']:>12}{result['peak_rss_kb']:>13}"
+              f"{result['template_bytes']:>16}")
+
+        if args.update_baselines:
+            baselines[case] = result
+        elif case in baselines:
+            regressions += compare(case, result, baselines[case], tolerances)
+
+    if args.update_baselines:
+        with open(BASELINES_PATH, "w") as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"baselines written to {BASELINES_PATH}")
+        return 0
+
+    for regression in regressions:
+        print("REGRESSION", regression)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
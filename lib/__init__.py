@@ -1 +1,36 @@
+import importlib
 
+# Constructs are resolved on first attribute access so an app only loads the
+# construct modules, and the jsii assemblies behind them, that it uses
+_LAZY_ATTRIBUTES = {
+    "ApiLambdaIntegationRestConstruct":
+    "apigw_lambda_integration_rest_construct",
+    "CloudwatchDashboardConstruct": "cloudwatchdashboard_construct",
+    "DbConstruct": "db_construct",
+    "FleetDashboardConstruct": "fleet_dashboard_construct",
+    "LambdaBundlingConstruct": "lambda_bundling_construct",
+    "LambdaConstruct": "lambda_construct",
+    "QueueConstruct": "queue_construct",
+    "S3StaticSiteConstruct": "s3staticsite_construct",
+    "S3StaticSiteDeploymentConstruct": "s3staticsite_deployment_construct",
+    "ConfigError": "construct_config",
+    "load_config": "construct_config",
+    "validate_context": "construct_config",
+}
+
+__all__ = sorted(_LAZY_ATTRIBUTES)
+
+
+def __getattr__(name: str):
+    module_name = _LAZY_ATTRIBUTES.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    module = importlib.import_module("." + module_name, __name__)
+    value = getattr(module, name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
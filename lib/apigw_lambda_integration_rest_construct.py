@@ -1,45 +1,124 @@
+import json
+import typing
+
 from aws_cdk import (
     core,
-    aws_lambda as _lambda,
     aws_apigateway as _api_gw,
+    aws_iam as _iam,
     aws_logs as _logs,
 )
 
 from aws_cdk.aws_apigateway import (MethodLoggingLevel, EndpointType,
                                     AccessLogFormat, LogGroupLogDestination,
                                     JsonSchemaVersion, JsonSchemaType,
-                                    MethodResponse, PassthroughBehavior)
+                                    MethodResponse, PassthroughBehavior,
+                                    MethodDeploymentOptions, ContentHandling,
+                                    ResponseType)
+
+from .construct_config import (ACCESS_LOG_METRICS, GatewayConfig,
+                               LambdaConfig, RequestModelConfig, load_config)
+
+if typing.TYPE_CHECKING:
+    from aws_cdk import aws_lambda as _lambda, aws_apigatewayv2 as _api_gw_v2
 
 LOG_INFO = MethodLoggingLevel.INFO
 LOG_ERROR = MethodLoggingLevel.ERROR
 LOG_RETENTION_PERIOD = _logs.RetentionDays.ONE_WEEK
+# json_with_standard_fields plus the latencies and the calling API key
+REST_ACCESS_LOG_FORMAT = {
+    "requestId": "$context.requestId",
+    "ip": "$context.identity.sourceIp",
+    "user": "$context.identity.user",
+    "requestTime": "$context.requestTime",
+    "httpMethod": "$context.httpMethod",
+    "resourcePath": "$context.resourcePath",
+    "status": "$context.status",
+    "protocol": "$context.protocol",
+    "responseLength": "$context.responseLength",
+    "responseLatency": "$context.responseLatency",
+    "integrationLatency": "$context.integrationLatency",
+    "apiKeyId": "$context.identity.apiKeyId",
+}
+# HTTP API access log, the v2 counterpart of json_with_standard_fields
+HTTP_ACCESS_LOG_FORMAT = {
+    "requestId": "$context.requestId",
+    "ip": "$context.identity.sourceIp",
+    "requestTime": "$context.requestTime",
+    "httpMethod": "$context.httpMethod",
+    "routeKey": "$context.routeKey",
+    "status": "$context.status",
+    "protocol": "$context.protocol",
+    "responseLength": "$context.responseLength",
+    "responseLatency": "$context.responseLatency",
+    "integrationLatency": "$context.integrationLatency",
+    "integrationError": "$context.integrationErrorMessage",
+}
+# Validation failures answer in the shape of the error response model
+VALIDATION_ERROR_TEMPLATE = json.dumps({
+    "state": "BAD_REQUEST",
+    "message": "$context.error.validationErrorString",
+})
 
 
 class ApiLambdaIntegationRestConstruct(core.Construct):
     def __init__(self, scope: core.Construct, construct_id: str, stage: str,
-                 lambda_fn_alias: _lambda.IAlias, gw_context: str,
+                 lambda_fn_alias: "_lambda.IAlias", gw_context: str,
+                 fn_config: LambdaConfig = None,
                  **kwargs) -> None:
         super().__init__(scope, construct_id, **kwargs)
 
-        gw = dict(self.node.try_get_context(gw_context))
+        gw = load_config(self, GatewayConfig, gw_context)
+        self.http_stage = None
+
+        # Stage cache settings
+        cache_enabled = gw.gw_cache_enabled
+        cache_key_parameters = gw.gw_cache_key_parameters
+        cache_overrides = gw.gw_cache_method_overrides if cache_enabled \
+            else {}
+
+        # Per method cache and throttle settings share the stage's method
+        # options
+        method_options = {}
+        for path in list(cache_overrides) + [
+                path for path in gw.gw_method_throttles
+                if path not in cache_overrides
+        ]:
+            override = cache_overrides.get(path)
+            throttle = gw.gw_method_throttles.get(path)
+            method_options[path] = MethodDeploymentOptions(
+                caching_enabled=override.enabled if override else None,
+                cache_ttl=core.Duration.seconds(override.ttl)
+                if override and override.ttl is not None else None,
+                cache_data_encrypted=gw.gw_cache_encrypted
+                if override else None,
+                throttling_rate_limit=throttle.rate_limit
+                if throttle else None,
+                throttling_burst_limit=throttle.burst_limit
+                if throttle else None,
+            )
 
         # # api gateway log groups
 
         api_log_group = _logs.LogGroup(
             self,
-            gw["gw_log_group_name"],
-            log_group_name="/aws/apigateway/" + gw["gw_log_group_name"],
+            gw.gw_log_group_name,
+            log_group_name="/aws/apigateway/" + gw.gw_log_group_name,
             retention=LOG_RETENTION_PERIOD,
             removal_policy=core.RemovalPolicy.DESTROY)
 
+        # Low latency proxy on an HTTP API instead of the REST API below
+        if gw.gw_api_type == "HTTP":
+            self.build_http_api(gw, stage, lambda_fn_alias, api_log_group)
+            return
+
         # # api gateway to handle post requests
         gateway = _api_gw.RestApi(
             self,
-            gw["gw_name"],
-            rest_api_name=gw["gw_name"],
+            gw.gw_name,
+            rest_api_name=gw.gw_name,
             deploy_options={
                 "description":
-                gw["gw_stage_description"],
+                gw.gw_stage_description,
                 "logging_level":
                 LOG_INFO,
                 "tracing_enabled":
@@ -49,6 +128,8 @@ class ApiLambdaIntegationRestConstruct(core.Construct):
                 "access_log_destination":
                 LogGroupLogDestination(api_log_group),
                 "access_log_format":
+                AccessLogFormat.custom(json.dumps(REST_ACCESS_LOG_FORMAT))
+                if gw.gw_access_log_latency else
                 AccessLogFormat.json_with_standard_fields(caller=False,
                                                           http_method=True,
                                                           ip=True,
@@ -60,26 +141,42 @@ class ApiLambdaIntegationRestConstruct(core.Construct):
                                                           user=True),
                 "metrics_enabled":
                 True,
+                "cache_cluster_enabled":
+                cache_enabled,
+                "cache_cluster_size":
+                gw.gw_cache_cluster_size if cache_enabled else None,
+                "caching_enabled":
+                cache_enabled,
+                "cache_ttl":
+                core.Duration.seconds(gw.gw_cache_ttl)
+                if cache_enabled else None,
+                "cache_data_encrypted":
+                gw.gw_cache_encrypted if cache_enabled else None,
+                "method_options":
+                method_options or None,
             },
             endpoint_configuration={
                 "types": [
-                    EndpointType.REGIONAL if gw["gw_endpoint_type"]
-                    == "regional" else EndpointType.EDGE
+                    getattr(EndpointType, gw.gw_endpoint_type)
                 ]
             },
             deploy=True,
             cloud_watch_role=True,
-            description=gw["gw_description"],
+            description=gw.gw_description,
+            # Responses at or above the threshold are gzipped for clients
+            # that accept it
+            minimum_compression_size=gw.gw_minimum_compression_size,
+            binary_media_types=gw.gw_binary_media_types or None,
         )
 
         # Response modesls are neded for a non-proxy integration
         response_model = gateway.add_model(
-            gw["gw_response_model_name"],
+            gw.gw_response_model_name,
             content_type="application/json",
-            model_name=gw["gw_response_model_name"],
+            model_name=gw.gw_response_model_name,
             schema={
                 "schema": JsonSchemaVersion.DRAFT4,
-                "title": gw["gw_response_model_name"],
+                "title": gw.gw_response_model_name,
                 "type": JsonSchemaType.OBJECT,
                 "properties": {
                     "message": {
@@ -89,12 +186,12 @@ class ApiLambdaIntegationRestConstruct(core.Construct):
             })
 
         error_response_model = gateway.add_model(
-            gw["gw_error_response_model_name"],
+            gw.gw_error_response_model_name,
             content_type="application/json",
-            model_name=gw["gw_error_response_model_name"],
+            model_name=gw.gw_error_response_model_name,
             schema={
                 "schema": JsonSchemaVersion.DRAFT4,
-                "title": gw["gw_error_response_model_name"],
+                "title": gw.gw_error_response_model_name,
                 "type": JsonSchemaType.OBJECT,
                 "properties": {
                     "state": {
@@ -106,24 +203,66 @@ class ApiLambdaIntegationRestConstruct(core.Construct):
                 }
             })
 
-        # Setting passthrough behavior
-        pass_context = gw["gw_passthrough_behavior"]
+        # Requests are checked against the model and the required
+        # parameters before they reach the integration, so malformed ones
+        # are rejected at the gateway and never invoke the function
+        request_parameters = {
+            param: param.startswith("method.request.path.")
+            for param in cache_key_parameters
+        }
+        request_parameters.update(gw.gw_request_parameters)
+        validate_parameters = any(request_parameters.values())
 
-        passthrough_behavior = PassthroughBehavior.WHEN_NO_TEMPLATES if pass_context == "WHEN_NO_TEMPLATES" else PassthroughBehavior.WHEN_NO_MATCH if pass_context == "WHEN_NO_MATCH" else PassthroughBehavior.NEVER
+        request_models = None
+        request_validator = None
+        if gw.gw_request_model or validate_parameters:
+            request_validator = gateway.add_request_validator(
+                "RequestValidator",
+                request_validator_name=gw.gw_name + "-validator",
+                validate_request_body=gw.gw_request_model is not None,
+                validate_request_parameters=validate_parameters)
+            for response_id, response_type in (
+                ("BadRequestBody", ResponseType.BAD_REQUEST_BODY),
+                ("BadRequestParameters", ResponseType.BAD_REQUEST_PARAMETERS),
+            ):
+                gateway.add_gateway_response(
+                    response_id,
+                    type=response_type,
+                    status_code="400",
+                    templates={"application/json": VALIDATION_ERROR_TEMPLATE})
+        if gw.gw_request_model:
+            request_model = self.add_request_model(gateway,
+                                                   gw.gw_request_model)
+            request_models = {
+                gw.gw_request_model.content_type: request_model
+            }
+
+        # Setting passthrough behavior
+        passthrough_behavior = getattr(PassthroughBehavior,
+                                       gw.gw_passthrough_behavior)
 
         lambda_integration = _api_gw.LambdaIntegration(
             lambda_fn_alias,
             proxy=False,
             passthrough_behavior=passthrough_behavior,
+            cache_key_parameters=cache_key_parameters or None,
+            # Binary bodies reach the function base64 encoded
+            content_handling=ContentHandling.CONVERT_TO_TEXT
+            if gw.gw_binary_media_types else None,
         )
 
         gateway_root_resource = gateway.root.add_resource(
-            gw["gw_root_resource"])
+            gw.gw_root_resource)
 
         gateway_post_method = gateway_root_resource.add_method(
-            gw["gw_method"],
+            gw.gw_method,
             lambda_integration,
             api_key_required=True,
+            # cache keys have to be declared on the method request, path
+            # parameters are always required
+            request_parameters=request_parameters or None,
+            request_models=request_models,
+            request_validator=request_validator,
             method_responses=[
                 MethodResponse(
                     status_code='200',
@@ -135,33 +274,50 @@ class ApiLambdaIntegationRestConstruct(core.Construct):
             ])
 
         gateway_root_resource.add_cors_preflight(
-            allow_origins=[gw["gw_origins_cors"]],
-            allow_methods=[gw["gw_origins_cors_method"]])
+            allow_origins=[gw.gw_origins_cors],
+            allow_methods=[gw.gw_origins_cors_method])
 
-        gateway_post_key = gateway.add_api_key(
-            gw["gw_api_key_name"],
-            api_key_name=gw["gw_api_key_name"],
-        )
+        if gw.gw_usage_plans:
+            self.add_usage_plans(gateway, gw, {
+                gw.api_key_method_path: gateway_post_method,
+            })
+        else:
+            gateway_post_key = gateway.add_api_key(
+                gw.gw_api_key_name,
+                api_key_name=gw.gw_api_key_name,
+            )
 
-        api_key_usage_plan = gateway.add_usage_plan(
-            gw["gw_api_key_usage_plan_name"],
-            name=gw["gw_api_key_usage_plan_name"],
-            api_key=gateway_post_key,
-            throttle={
-                "rate_limit": gw["gw_api_key_usage_throttle"],
-                "burst_limit": gw["gw_api_key_usage_burst"],
-            },
-        )
+            api_key_usage_plan = gateway.add_usage_plan(
+                gw.gw_api_key_usage_plan_name,
+                name=gw.gw_api_key_usage_plan_name,
+                api_key=gateway_post_key,
+                throttle={
+                    "rate_limit": gw.gw_api_key_usage_throttle,
+                    "burst_limit": gw.gw_api_key_usage_burst,
+                },
+            )
+
+            api_key_usage_plan.add_api_stage(
+                stage=gateway.deployment_stage,
+                throttle=[{
+                    "method": gateway_post_method,
+                    "throttle": {
+                        "rate_limit": gw.gw_api_key_usage_throttle,
+                        "burst_limit": gw.gw_api_key_usage_burst,
+                    }
+                }])
+
+        # The function has to keep up with every plan at its limit
+        if fn_config:
+            self.check_plan_capacity(gw, fn_config)
+
+        # Cache invalidation authorization is not part of the CloudFormation
+        # stage, so it is patched onto the stage after deployment
+        if cache_enabled and gw.gw_cache_require_authorization is not None:
+            self.configure_cache_invalidation(gateway, gw)
+
+        self.add_access_log_insights(gw, api_log_group)
 
-        api_key_usage_plan.add_api_stage(
-            stage=gateway.deployment_stage,
-            throttle=[{
-                "method": gateway_post_method,
-                "throttle": {
-                    "rate_limit": gw["gw_api_key_usage_throttle"],
-                    "burst_limit": gw["gw_api_key_usage_burst"],
-                }
-            }])
         # # Outputs
 
         core.CfnOutput(self, "ApiGwUrl", value=(gateway.url))
@@ -172,6 +328,275 @@ class ApiLambdaIntegationRestConstruct(core.Construct):
 
         self.apigw = gateway
 
+    def build_http_api(self, gw: GatewayConfig, stage: str,
+                       lambda_fn_alias: "_lambda.IAlias",
+                       api_log_group: _logs.LogGroup) -> None:
+        # apigatewayv2 is only loaded in HTTP mode
+        from aws_cdk import (aws_apigatewayv2 as _api_gw_v2,
+                             aws_apigatewayv2_integrations as _integrations)
+
+        http_api = _api_gw_v2.HttpApi(
+            self,
+            gw.gw_name,
+            api_name=gw.gw_name,
+            description=gw.gw_description,
+            create_default_stage=False,
+            cors_preflight=_api_gw_v2.CorsPreflightOptions(
+                allow_origins=[gw.gw_origins_cors],
+                allow_methods=[
+                    getattr(_api_gw_v2.CorsHttpMethod,
+                            gw.gw_origins_cors_method)
+                ]),
+        )
+
+        http_api.add_routes(
+            path="/" + gw.gw_root_resource,
+            methods=[getattr(_api_gw_v2.HttpMethod, gw.gw_method)],
+            integration=_integrations.LambdaProxyIntegration(
+                handler=lambda_fn_alias,
+                payload_format_version=_api_gw_v2.PayloadFormatVersion.
+                VERSION_2_0),
+        )
+
+        http_stage = _api_gw_v2.HttpStage(self,
+                                          "HttpStage",
+                                          http_api=http_api,
+                                          stage_name=stage,
+                                          auto_deploy=True)
+
+        # HTTP APIs have no usage plans, the usage plan throttle becomes the
+        # stage default. Throttling and access logs are not on the 1.95 L2
+        # stage yet, so they are set on the L1
+        cfn_stage = http_stage.node.default_child
+        cfn_stage.add_property_override("Description",
+                                        gw.gw_stage_description)
+        cfn_stage.add_property_override(
+            "DefaultRouteSettings", {
+                "ThrottlingRateLimit": gw.gw_api_key_usage_throttle,
+                "ThrottlingBurstLimit": gw.gw_api_key_usage_burst,
+                "DetailedMetricsEnabled": gw.gw_http_detailed_metrics,
+            })
+        cfn_stage.add_property_override(
+            "AccessLogSettings", {
+                "DestinationArn": api_log_group.log_group_arn,
+                "Format": json.dumps(HTTP_ACCESS_LOG_FORMAT),
+            })
+
+        self.add_access_log_insights(gw, api_log_group)
+
+        core.CfnOutput(self, "ApiGwUrl", value=(http_stage.url))
+
+        core.CfnOutput(self,
+                       "ApiGWLogGroup",
+                       value=(api_log_group.log_group_name))
+
+        self.apigw = http_api
+        self.http_stage = http_stage
+
+    def add_usage_plans(self, gateway: _api_gw.RestApi, gw: GatewayConfig,
+                        methods: typing.Dict[str, _api_gw.Method]) -> None:
+        for tier in gw.gw_usage_plans:
+            usage_plan = gateway.add_usage_plan(
+                tier.name,
+                name=tier.name,
+                throttle=_api_gw.ThrottleSettings(
+                    rate_limit=tier.rate_limit,
+                    burst_limit=tier.burst_limit),
+                quota=_api_gw.QuotaSettings(
+                    limit=tier.quota_limit,
+                    period=getattr(_api_gw.Period, tier.quota_period))
+                if tier.quota_limit else None,
+            )
+            for key_name in tier.api_keys:
+                usage_plan.add_api_key(
+                    gateway.add_api_key(key_name, api_key_name=key_name))
+            usage_plan.add_api_stage(
+                stage=gateway.deployment_stage,
+                throttle=[
+                    _api_gw.ThrottlingPerMethod(
+                        method=methods[path],
+                        throttle=_api_gw.ThrottleSettings(
+                            rate_limit=throttle.rate_limit,
+                            burst_limit=throttle.burst_limit))
+                    for path, throttle in tier.method_throttles.items()
+                ] or None)
+
+    def check_plan_capacity(self, gw: GatewayConfig,
+                            fn: LambdaConfig) -> None:
+        # Unreserved functions share the account pool, nothing to size
+        # the plans against
+        if fn.fn_reserved_concurrency is None:
+            return
+
+        annotations = core.Annotations.of(self)
+        rate, burst = gw.plan_limits()
+        # Sized from the declared invocation duration, without one the
+        # worst case of every invocation hitting fn_timeout only warns
+        if fn.fn_expected_duration_ms:
+            report = annotations.add_error
+            duration = fn.fn_expected_duration_ms / 1000
+            basis = f"fn_expected_duration_ms={fn.fn_expected_duration_ms:g}"
+        else:
+            report = annotations.add_warning
+            duration = fn.fn_timeout
+            basis = f"fn_timeout={fn.fn_timeout}s"
+        throughput = fn.fn_reserved_concurrency / duration
+        if burst > fn.fn_reserved_concurrency:
+            report(f"Usage plans allow bursts of {burst} requests, above "
+                   f"fn_reserved_concurrency={fn.fn_reserved_concurrency}, "
+                   "the excess is throttled by Lambda")
+        if rate > throughput:
+            report(f"Usage plans allow {rate:g} req/s, fn_reserved_concurrency="
+                   f"{fn.fn_reserved_concurrency} at {basis} sustains "
+                   f"{throughput:g} req/s")
+
+    def add_access_log_insights(self, gw: GatewayConfig,
+                                api_log_group: _logs.LogGroup) -> None:
+        resource = gw.access_log_resource_field
+
+        # Per route and status metrics from the access log, without adding
+        # anything to the request path. Dimensions and units are not on the
+        # 1.95 metric filter yet, so they are set on the L1.
+        if gw.gw_access_log_metrics:
+            for metric_name, (log_field, unit) in ACCESS_LOG_METRICS.items():
+                metric_filter = _logs.MetricFilter(
+                    self,
+                    metric_name + "Filter",
+                    log_group=api_log_group,
+                    metric_namespace=gw.access_log_namespace,
+                    metric_name=metric_name,
+                    # Fields without a value are logged as "-"
+                    filter_pattern=_logs.FilterPattern.string_value(
+                        f"$.{log_field}", "!=", "-"),
+                    metric_value=f"$.{log_field}",
+                )
+                cfn_filter = metric_filter.node.default_child
+                cfn_filter.add_property_override(
+                    "MetricTransformations.0.Dimensions", [
+                        {"Key": "Resource", "Value": f"$.{resource}"},
+                        {"Key": "Status", "Value": "$.status"},
+                    ])
+                cfn_filter.add_property_override(
+                    "MetricTransformations.0.Unit", unit)
+
+        # Saved Logs Insights queries, there is no L1 for them in 1.95
+        if gw.gw_access_log_queries:
+            callers = "ip, apiKeyId" if gw.gw_api_type == "REST" else "ip"
+            queries = {
+                "SlowestRoutes":
+                f"fields httpMethod, {resource}, responseLatency, "
+                "integrationLatency\n"
+                "| filter responseLatency != \"-\"\n"
+                "| stats count(*) as requests, "
+                "avg(responseLatency) as avgLatency, "
+                "pct(responseLatency, 99) as p99Latency, "
+                "max(integrationLatency) as maxIntegrationLatency "
+                f"by httpMethod, {resource}\n"
+                "| sort p99Latency desc\n"
+                "| limit 25",
+                "TopCallers":
+                f"stats count(*) as requests, sum(responseLength) as bytes "
+                f"by {callers}\n"
+                "| sort requests desc\n"
+                "| limit 25",
+            }
+            for query_name, query in queries.items():
+                core.CfnResource(
+                    self,
+                    query_name + "Query",
+                    type="AWS::Logs::QueryDefinition",
+                    properties={
+                        "Name": f"{gw.gw_name}/{query_name}",
+                        "QueryString": query,
+                        "LogGroupNames": [api_log_group.log_group_name],
+                    })
+
+    def add_request_model(self, gateway: _api_gw.RestApi,
+                          model: RequestModelConfig) -> _api_gw.Model:
+        properties = {
+            name: _api_gw.JsonSchema(type=getattr(JsonSchemaType, prop.type),
+                                     max_length=prop.max_length,
+                                     pattern=prop.pattern)
+            for name, prop in model.properties.items()
+        }
+
+        return gateway.add_model(
+            model.name,
+            content_type=model.content_type,
+            model_name=model.name,
+            schema={
+                "schema": JsonSchemaVersion.DRAFT4,
+                "title": model.name,
+                "type": JsonSchemaType.OBJECT,
+                "properties": properties,
+                "required": model.required or None,
+                "additional_properties": model.additional_properties,
+            })
+
+    def configure_cache_invalidation(self, gateway: _api_gw.RestApi,
+                                     gw: GatewayConfig) -> None:
+        # custom_resources is only loaded when the stage needs patching
+        from aws_cdk import custom_resources as _cr
+
+        stage = gateway.deployment_stage
+        patch_operations = [{
+            "op": "replace",
+            "path": "/*/*/caching/requireAuthorizationForCacheControl",
+            "value": str(gw.gw_cache_require_authorization).lower(),
+        }, {
+            "op":
+            "replace",
+            "path":
+            "/*/*/caching/unauthorizedCacheControlHeaderStrategy",
+            "value":
+            gw.gw_cache_unauthorized_strategy,
+        }]
+        update_stage = _cr.AwsSdkCall(
+            service="APIGateway",
+            action="updateStage",
+            parameters={
+                "restApiId": gateway.rest_api_id,
+                "stageName": stage.stage_name,
+                "patchOperations": patch_operations,
+            },
+            physical_resource_id=_cr.PhysicalResourceId.of(
+                gateway.rest_api_id + "-cache-authorization"),
+        )
+
+        cache_authorization = _cr.AwsCustomResource(
+            self,
+            "CacheInvalidationAuthorization",
+            on_create=update_stage,
+            on_update=update_stage,
+            policy=_cr.AwsCustomResourcePolicy.from_statements([
+                _iam.PolicyStatement(
+                    actions=["apigateway:PATCH"],
+                    resources=[
+                        core.Stack.of(self).format_arn(
+                            service="apigateway",
+                            account="",
+                            resource="/restapis",
+                            resource_name=gateway.rest_api_id + "/stages/" +
+                            stage.stage_name,
+                        )
+                    ])
+            ]),
+        )
+        cache_authorization.node.add_dependency(stage)
+
+    def grant_cache_invalidation(self,
+                                 grantee: _iam.IGrantable) -> _iam.Grant:
+        return _iam.Grant.add_to_principal(
+            grantee=grantee,
+            actions=["execute-api:InvalidateCache"],
+            resource_arns=[self.apigw.arn_for_execute_api()],
+        )
+
     @property
-    def main_api(self) -> _api_gw.IRestApi:
+    def main_api(
+            self) -> typing.Union[_api_gw.IRestApi, "_api_gw_v2.IHttpApi"]:
         return self.apigw
+
+    @property
+    def main_http_stage(self) -> "_api_gw_v2.IHttpStage":
+        return self.http_stage
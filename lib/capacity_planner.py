@@ -0,0 +1,79 @@
+import math
+import typing
+from dataclasses import dataclass
+
+# Plain python, construct_config uses it to resolve capacities
+if typing.TYPE_CHECKING:
+    from .construct_config import TrafficProfileConfig
+
+# Size covered by one read and one write unit
+READ_UNIT_KB = 4
+WRITE_UNIT_KB = 1
+# Read units per 4 KB read, by consistency
+READ_UNITS_PER_REQUEST = {
+    "EVENTUAL": 0.5,
+    "STRONG": 1,
+    "TRANSACTIONAL": 2,
+}
+TRANSACTIONAL_WRITE_UNITS = 2
+
+# us-east-1 list prices in USD, only used to compare the billing modes
+PROVISIONED_RCU_HOUR = 0.00013
+PROVISIONED_WCU_HOUR = 0.00065
+ON_DEMAND_READ_UNIT = 0.25 / 1000000
+ON_DEMAND_WRITE_UNIT = 1.25 / 1000000
+HOURS_PER_MONTH = 730
+
+
+@dataclass(frozen=True)
+class CapacityPlan:
+    min_read_capacity: int
+    max_read_capacity: int
+    min_write_capacity: int
+    max_write_capacity: int
+
+
+def request_units(
+        profile: "TrafficProfileConfig") -> typing.Tuple[float, float]:
+    # Average read and write units per second, items round up to whole units
+    read_units = profile.reads_per_second * math.ceil(
+        profile.item_size_kb / READ_UNIT_KB) * READ_UNITS_PER_REQUEST[
+            profile.read_consistency]
+    write_units = profile.writes_per_second * math.ceil(
+        profile.item_size_kb / WRITE_UNIT_KB)
+    if profile.transactional_writes:
+        write_units *= TRANSACTIONAL_WRITE_UNITS
+    return read_units, write_units
+
+
+def plan_capacity(profile: "TrafficProfileConfig",
+                  target_utilization: float) -> CapacityPlan:
+    # Autoscaling keeps consumption at the target, so the average sets the
+    # floor and the peak sets the ceiling
+    read_units, write_units = request_units(profile)
+    utilization = target_utilization / 100
+    min_read = max(1, math.ceil(read_units / utilization))
+    min_write = max(1, math.ceil(write_units / utilization))
+    return CapacityPlan(
+        min_read_capacity=min_read,
+        max_read_capacity=max(
+            min_read,
+            math.ceil(read_units * profile.peak_multiplier / utilization)),
+        min_write_capacity=min_write,
+        max_write_capacity=max(
+            min_write,
+            math.ceil(write_units * profile.peak_multiplier / utilization)),
+    )
+
+
+def monthly_costs(profile: "TrafficProfileConfig", max_read_capacity: int,
+                  max_write_capacity: int) -> typing.Tuple[float, float]:
+    # Scale downs are rationed and lag the traffic, so provisioned capacity
+    # is priced at its ceiling. On demand is priced per request.
+    read_units, write_units = request_units(profile)
+    provisioned = HOURS_PER_MONTH * (
+        max_read_capacity * PROVISIONED_RCU_HOUR +
+        max_write_capacity * PROVISIONED_WCU_HOUR)
+    on_demand = HOURS_PER_MONTH * 3600 * (
+        read_units * ON_DEMAND_READ_UNIT + write_units * ON_DEMAND_WRITE_UNIT)
+    return provisioned, on_demand
@@ -1,15 +1,49 @@
-from aws_cdk import (aws_lambda as _lambda, aws_apigateway as _api_gw,
-                     aws_dynamodb as _ddb, aws_cloudwatch as cloud_watch, core)
+import typing
+
+from aws_cdk import (aws_cloudwatch as cloud_watch, core)
 import jsii
 
+# Only needed for type hints, the resources are passed in
+if typing.TYPE_CHECKING:
+    from aws_cdk import (aws_lambda as _lambda, aws_apigateway as _api_gw,
+                         aws_apigatewayv2 as _api_gw_v2, aws_dynamodb as _ddb)
+
+from .construct_config import (ACCESS_LOG_METRICS, GatewayConfig,
+                               LambdaConfig, SloConfig, load_config)
+
+# Constants
+DEFAULT_API_PERIOD_SECONDS = 900
+DEFAULT_METRIC_PERIOD_SECONDS = 300
+# HTTP APIs publish the error counts under lower case names
+HTTP_API_METRIC_NAMES = {"4XXError": "4xx", "5XXError": "5xx"}
+
 
 class CloudwatchDashboardConstruct(core.Construct):
     def __init__(self, scope: core.Construct, id: str, stage: str,
-                 api: _api_gw.IRestApi, fn: _lambda.IFunction,
-                 table: _ddb.ITable, **kwargs) -> None:
+                 api: typing.Union["_api_gw.IRestApi", "_api_gw_v2.IHttpApi"],
+                 fn: "_lambda.IFunction",
+                 table: "_ddb.ITable",
+                 dax_cluster_name: str = None,
+                 stream_consumer_fn: "_lambda.IFunction" = None,
+                 slo_context: str = None,
+                 period: int = None,
+                 fn_config: LambdaConfig = None,
+                 **kwargs) -> None:
         super().__init__(scope, id, **kwargs)
 
-        gw = dict(self.node.try_get_context("gateway"))
+        gw = load_config(self, GatewayConfig, "gateway")
+
+        # HTTP APIs are dimensioned by id rather than by name
+        self.http_api_id = api.api_id if gw.gw_api_type == "HTTP" else None
+
+        # One period for every graph when set, otherwise API Gateway and DAX
+        # graph 15 min datapoints and Lambda and DynamoDB 5 min
+        self.period = period or DEFAULT_API_PERIOD_SECONDS
+        self.metric_period = period or DEFAULT_METRIC_PERIOD_SECONDS
+        metric_period = core.Duration.seconds(self.metric_period)
+
+        self.slo_alarms = {}
+        self.slo_composite_alarms = {}
 
         ###
         # Custom Metrics
@@ -23,7 +57,7 @@ class CloudwatchDashboardConstruct(core.Construct):
                 "i": fn.metric(metric_name="Invocations", statistic="sum"),
                 "e": fn.metric(metric_name="Errors", statistic="sum"),
             },
-            period=core.Duration.minutes(5))
+            period=metric_period)
 
         # note: throttled requests are not counted in total num of invocations
         lambda_throttled_perc = cloud_watch.MathExpression(
@@ -33,7 +67,7 @@ class CloudwatchDashboardConstruct(core.Construct):
                 "i": fn.metric(metric_name="Invocations", statistic="sum"),
                 "t": fn.metric(metric_name="Throttles", statistic="sum"),
             },
-            period=core.Duration.minutes(5))
+            period=metric_period)
 
         dashboard = cloud_watch.Dashboard(self,
                                           id="CloudWatchDashBoard",
@@ -44,7 +78,7 @@ class CloudwatchDashboardConstruct(core.Construct):
                                     width=8,
                                     left=[
                                         self.metric_for_api_gw(
-                                            api_name=gw["gw_name"],
+                                            api_name=gw.gw_name,
                                             stage=stage,
                                             metric_name="Count",
                                             label="# Requests",
@@ -55,17 +89,17 @@ class CloudwatchDashboardConstruct(core.Construct):
                 width=8,
                 stacked=True,
                 left=[
-                    self.metric_for_api_gw(api_name=gw["gw_name"],
+                    self.metric_for_api_gw(api_name=gw.gw_name,
                                            stage=stage,
                                            metric_name="Latency",
                                            label="API Latency p50",
                                            stat="p50"),
-                    self.metric_for_api_gw(api_name=gw["gw_name"],
+                    self.metric_for_api_gw(api_name=gw.gw_name,
                                            stage=stage,
                                            metric_name="Latency",
                                            label="API Latency p90",
                                            stat="p90"),
-                    self.metric_for_api_gw(api_name=gw["gw_name"],
+                    self.metric_for_api_gw(api_name=gw.gw_name,
                                            stage=stage,
                                            metric_name="Latency",
                                            label="API Latency p99",
@@ -76,12 +110,12 @@ class CloudwatchDashboardConstruct(core.Construct):
                 width=8,
                 stacked=True,
                 left=[
-                    self.metric_for_api_gw(api_name=gw["gw_name"],
+                    self.metric_for_api_gw(api_name=gw.gw_name,
                                            stage=stage,
                                            metric_name="4XXError",
                                            label="4XX Errors",
                                            stat="sum"),
-                    self.metric_for_api_gw(api_name=gw["gw_name"],
+                    self.metric_for_api_gw(api_name=gw.gw_name,
                                            stage=stage,
                                            metric_name="5XXError",
                                            label="5XX Errors",
@@ -90,14 +124,15 @@ class CloudwatchDashboardConstruct(core.Construct):
             cloud_watch.GraphWidget(title="Dynamo Lambda Error %",
                                     width=8,
                                     left=[lambda_error_perc]),
-            cloud_watch.GraphWidget(title="Dynamo Lambda Duration",
-                                    width=8,
-                                    stacked=True,
-                                    left=[
-                                        fn.metric_duration(statistic="p50"),
-                                        fn.metric_duration(statistic="p90"),
-                                        fn.metric_duration(statistic="p99")
-                                    ]),
+            cloud_watch.GraphWidget(
+                title="Dynamo Lambda Duration",
+                width=8,
+                stacked=True,
+                left=[
+                    fn.metric_duration(statistic="p50", period=metric_period),
+                    fn.metric_duration(statistic="p90", period=metric_period),
+                    fn.metric_duration(statistic="p99", period=metric_period)
+                ]),
             cloud_watch.GraphWidget(title="Dynamo Lambda Throttle %",
                                     width=8,
                                     left=[lambda_throttled_perc]),
@@ -109,36 +144,21 @@ class CloudwatchDashboardConstruct(core.Construct):
                     table.metric_successful_request_latency(
                         dimensions={
                             "TableName": table.table_name,
-                            "Operation": "GetItem"
-                        }),
-                    table.metric_successful_request_latency(
-                        dimensions={
-                            "TableName": table.table_name,
-                            "Operation": "UpdateItem"
-                        }),
-                    table.metric_successful_request_latency(
-                        dimensions={
-                            "TableName": table.table_name,
-                            "Operation": "PutItem"
-                        }),
-                    table.metric_successful_request_latency(
-                        dimensions={
-                            "TableName": table.table_name,
-                            "Operation": "DeleteItem"
-                        }),
-                    table.metric_successful_request_latency(
-                        dimensions={
-                            "TableName": table.table_name,
-                            "Operation": "Query"
-                        }),
+                            "Operation": operation
+                        },
+                        period=metric_period)
+                    for operation in ("GetItem", "UpdateItem", "PutItem",
+                                      "DeleteItem", "Query")
                 ]),
             cloud_watch.GraphWidget(
                 title="DynamoDB Consumed Read/Write Units",
                 width=8,
                 stacked=False,
                 left=[
-                    table.metric(metric_name="ConsumedReadCapacityUnits"),
-                    table.metric(metric_name="ConsumedWriteCapacityUnits")
+                    table.metric(metric_name="ConsumedReadCapacityUnits",
+                                 period=metric_period),
+                    table.metric(metric_name="ConsumedWriteCapacityUnits",
+                                 period=metric_period)
                 ]),
             cloud_watch.GraphWidget(
                 title="DynamoDB Throttles",
@@ -146,12 +166,381 @@ class CloudwatchDashboardConstruct(core.Construct):
                 stacked=True,
                 left=[
                     table.metric(metric_name="ReadThrottleEvents",
-                                 statistic="sum"),
+                                 statistic="sum",
+                                 period=metric_period),
                     table.metric(metric_name="WriteThrottleEvents",
-                                 statistic="sum")
+                                 statistic="sum",
+                                 period=metric_period)
                 ]),
         )
 
+        # HTTP APIs report the time spent in the Lambda integration apart
+        # from the end to end latency
+        if self.http_api_id:
+            dashboard.add_widgets(
+                cloud_watch.GraphWidget(
+                    title="API GW Integration Latency",
+                    width=8,
+                    stacked=True,
+                    left=[
+                        self.metric_for_api_gw(
+                            api_name=gw.gw_name,
+                            stage=stage,
+                            metric_name="IntegrationLatency",
+                            label=f"Integration Latency {stat}",
+                            stat=stat)
+                        for stat in ("p50", "p90", "p99")
+                    ]))
+
+        # Per route and status metrics from the access log metric filters
+        if gw.gw_access_log_metrics:
+            dashboard.add_widgets(*[
+                cloud_watch.GraphWidget(
+                    title=f"API GW {metric_name} by Route",
+                    width=8,
+                    left=[
+                        self.metric_for_access_log(
+                            namespace=gw.access_log_namespace,
+                            metric_name=metric_name,
+                            stat="Sum" if unit == "Bytes" else "p99")
+                    ])
+                for metric_name, (_, unit) in ACCESS_LOG_METRICS.items()
+            ])
+
+        # API Gateway stage cache offload
+        if gw.gw_cache_enabled:
+            cache_hits = self.metric_for_api_gw(api_name=gw.gw_name,
+                                                stage=stage,
+                                                metric_name="CacheHitCount",
+                                                label="Cache Hits",
+                                                stat="sum")
+            cache_misses = self.metric_for_api_gw(api_name=gw.gw_name,
+                                                  stage=stage,
+                                                  metric_name="CacheMissCount",
+                                                  label="Cache Misses",
+                                                  stat="sum")
+            cache_hit_perc = cloud_watch.MathExpression(
+                expression="h / (h + m) * 100",
+                label="% of requests served from the stage cache",
+                using_metrics={
+                    "h": cache_hits,
+                    "m": cache_misses,
+                },
+                period=core.Duration.seconds(self.period))
+
+            dashboard.add_widgets(
+                cloud_watch.GraphWidget(title="API GW Cache",
+                                        width=8,
+                                        stacked=True,
+                                        left=[cache_hits, cache_misses],
+                                        right=[cache_hit_perc]))
+
+        # DAX cache hits and misses when the table sits behind a DAX cluster
+        if dax_cluster_name:
+            dashboard.add_widgets(
+                cloud_watch.GraphWidget(
+                    title="DAX Item Cache",
+                    width=8,
+                    stacked=True,
+                    left=[
+                        self.metric_for_dax(cluster_name=dax_cluster_name,
+                                            metric_name="ItemCacheHits",
+                                            label="Item Cache Hits"),
+                        self.metric_for_dax(cluster_name=dax_cluster_name,
+                                            metric_name="ItemCacheMisses",
+                                            label="Item Cache Misses")
+                    ]),
+                cloud_watch.GraphWidget(
+                    title="DAX Query Cache",
+                    width=8,
+                    stacked=True,
+                    left=[
+                        self.metric_for_dax(cluster_name=dax_cluster_name,
+                                            metric_name="QueryCacheHits",
+                                            label="Query Cache Hits"),
+                        self.metric_for_dax(cluster_name=dax_cluster_name,
+                                            metric_name="QueryCacheMisses",
+                                            label="Query Cache Misses")
+                    ]),
+            )
+
+        # How far the stream consumer lags behind the newest table change
+        if stream_consumer_fn:
+            dashboard.add_widgets(
+                cloud_watch.GraphWidget(
+                    title="DynamoDB Stream Iterator Age",
+                    width=8,
+                    left=[
+                        stream_consumer_fn.metric(
+                            metric_name="IteratorAge",
+                            statistic="max",
+                            label="Iterator Age max",
+                            unit=cloud_watch.Unit.MILLISECONDS,
+                            period=metric_period)
+                    ],
+                    right=[
+                        stream_consumer_fn.metric_errors(
+                            statistic="sum", period=metric_period)
+                    ]))
+
+        # Lambda Insights and EMF metrics declared in the function config,
+        # e.g. LambdaConstruct.main_function_config
+        if fn_config and fn_config.fn_insights:
+            insights_metrics = {
+                "memory_utilization": ("Memory %", cloud_watch.Unit.PERCENT),
+                "cpu_total_time": ("CPU Time", cloud_watch.Unit.MILLISECONDS),
+                "init_duration":
+                ("Init Duration", cloud_watch.Unit.MILLISECONDS),
+            }
+            dashboard.add_widgets(*[
+                cloud_watch.GraphWidget(
+                    title=f"Lambda Insights {label}",
+                    width=8,
+                    left=[
+                        self.metric_for_insights(
+                            function_name=fn.function_name,
+                            metric_name=metric_name,
+                            label=f"{label} {stat}",
+                            unit=unit,
+                            stat=stat) for stat in ("p50", "p99", "max")
+                    ]) for metric_name, (label, unit) in insights_metrics.items()
+            ])
+
+        if fn_config and fn_config.fn_emf_metrics:
+            dashboard.add_widgets(*[
+                cloud_watch.GraphWidget(
+                    title=metric.label or metric.name,
+                    width=8,
+                    left=[
+                        self.build_metric(metric.name,
+                                          fn_config.fn_emf_namespace,
+                                          fn_config.fn_emf_dimensions, None,
+                                          f"{metric.name} {metric.stat}",
+                                          metric.stat, self.metric_period)
+                    ]) for metric in fn_config.fn_emf_metrics
+            ])
+
+        # SLO alarms, rolled up per service in composite alarms
+        if slo_context:
+            slo = load_config(self, SloConfig, slo_context)
+            self.add_slo_alarms(slo, dashboard, gw.gw_name, stage, fn, table,
+                                lambda_error_perc)
+
+    def add_slo_alarms(self, slo: SloConfig, dashboard: cloud_watch.Dashboard,
+                       api_name: str, stage: str, fn: "_lambda.IFunction",
+                       table: "_ddb.ITable",
+                       lambda_error_perc: cloud_watch.MathExpression) -> None:
+        period = core.Duration.seconds(slo.slo_period)
+        alarm_options = dict(
+            evaluation_periods=slo.slo_evaluation_periods,
+            datapoints_to_alarm=slo.slo_datapoints_to_alarm,
+            comparison_operator=cloud_watch.ComparisonOperator.
+            GREATER_THAN_THRESHOLD,
+            treat_missing_data=cloud_watch.TreatMissingData.NOT_BREACHING,
+        )
+        service_alarms = {"api": [], "lambda": [], "dynamodb": []}
+        threshold_widgets = []
+        anomaly_graphs = []
+
+        # Latency is reported in milliseconds, the alarm only matches
+        # datapoints published with the same unit
+        if slo.slo_api_p99_latency_ms:
+            api_latency = self.build_metric("Latency", "AWS/ApiGateway",
+                                            self.api_dimensions(api_name, stage),
+                                            cloud_watch.Unit.MILLISECONDS,
+                                            "API Latency p99", "p99",
+                                            slo.slo_period)
+            alarm = api_latency.create_alarm(
+                self,
+                "ApiLatencyP99Alarm",
+                alarm_name=f"{slo.slo_service_name}-api-latency-p99",
+                alarm_description=(f"API p99 latency above "
+                                   f"{slo.slo_api_p99_latency_ms} ms"),
+                threshold=slo.slo_api_p99_latency_ms,
+                **alarm_options)
+            service_alarms["api"].append(alarm)
+            threshold_widgets.append(("API GW Latency p99 SLO", alarm))
+
+        if slo.slo_request_anomaly_band:
+            service_alarms["api"].append(
+                self.add_request_anomaly_alarm(slo, api_name, stage))
+            requests = self.build_metric("Count", "AWS/ApiGateway",
+                                         self.api_dimensions(api_name, stage),
+                                         cloud_watch.Unit.COUNT, "# Requests",
+                                         "sum", slo.slo_period)
+            anomaly_graphs.append(
+                cloud_watch.GraphWidget(
+                    title="API GW Requests Expected Band",
+                    width=12,
+                    left=[
+                        requests,
+                        cloud_watch.MathExpression(
+                            expression=("ANOMALY_DETECTION_BAND(r, "
+                                        f"{slo.slo_request_anomaly_band})"),
+                            label="Expected band",
+                            using_metrics={"r": requests},
+                            period=period)
+                    ]))
+
+        if slo.slo_lambda_p99_duration_ms:
+            lambda_duration = fn.metric_duration(statistic="p99",
+                                                 period=period)
+            alarm = lambda_duration.create_alarm(
+                self,
+                "LambdaDurationP99Alarm",
+                alarm_name=f"{slo.slo_service_name}-lambda-duration-p99",
+                alarm_description=(f"Lambda p99 duration above "
+                                   f"{slo.slo_lambda_p99_duration_ms} ms"),
+                threshold=slo.slo_lambda_p99_duration_ms,
+                **alarm_options)
+            service_alarms["lambda"].append(alarm)
+            threshold_widgets.append(("Lambda Duration p99 SLO", alarm))
+
+        if slo.slo_lambda_error_perc:
+            alarm = lambda_error_perc.with_(period=period).create_alarm(
+                self,
+                "LambdaErrorPercAlarm",
+                alarm_name=f"{slo.slo_service_name}-lambda-error-perc",
+                alarm_description=(f"More than {slo.slo_lambda_error_perc}% "
+                                   "of invocations errored"),
+                threshold=slo.slo_lambda_error_perc,
+                **alarm_options)
+            service_alarms["lambda"].append(alarm)
+
+        # Any throttle at all is usually worth a look, so 0 is a valid
+        # threshold here
+        if slo.slo_ddb_throttle_events is not None:
+            ddb_throttles = cloud_watch.MathExpression(
+                expression="r + w",
+                label="DynamoDB throttle events",
+                using_metrics={
+                    "r": table.metric(metric_name="ReadThrottleEvents",
+                                      statistic="sum"),
+                    "w": table.metric(metric_name="WriteThrottleEvents",
+                                      statistic="sum"),
+                },
+                period=period)
+            alarm = ddb_throttles.create_alarm(
+                self,
+                "DynamoDbThrottleAlarm",
+                alarm_name=f"{slo.slo_service_name}-dynamodb-throttles",
+                alarm_description=(f"More than {slo.slo_ddb_throttle_events} "
+                                   "throttled DynamoDB requests"),
+                threshold=slo.slo_ddb_throttle_events,
+                **alarm_options)
+            service_alarms["dynamodb"].append(alarm)
+
+        # Only the composites notify, the member alarms stay quiet so one
+        # incident pages once per service
+        alarm_action = None
+        if slo.slo_alarm_topic_arn:
+            from aws_cdk import (aws_cloudwatch_actions as _cw_actions,
+                                 aws_sns as _sns)
+            alarm_action = _cw_actions.SnsAction(
+                _sns.Topic.from_topic_arn(self, "SloAlarmTopic",
+                                          slo.slo_alarm_topic_arn))
+
+        for service, alarms in service_alarms.items():
+            if not alarms:
+                continue
+            composite = cloud_watch.CompositeAlarm(
+                self,
+                f"{service.capitalize()}SloCompositeAlarm",
+                composite_alarm_name=f"{slo.slo_service_name}-{service}-slo",
+                alarm_description=f"{service} SLO breached",
+                alarm_rule=cloud_watch.AlarmRule.any_of(*[
+                    cloud_watch.AlarmRule.from_alarm(
+                        alarm, cloud_watch.AlarmState.ALARM)
+                    for alarm in alarms
+                ]))
+            if alarm_action:
+                composite.add_alarm_action(alarm_action)
+                composite.add_ok_action(alarm_action)
+            self.slo_alarms[service] = alarms
+            self.slo_composite_alarms[service] = composite
+
+        if not self.slo_composite_alarms:
+            return
+
+        dashboard.add_widgets(
+            cloud_watch.AlarmStatusWidget(
+                title="SLO Status",
+                width=24,
+                alarms=list(self.slo_composite_alarms.values()) +
+                [alarm for alarms in self.slo_alarms.values()
+                 for alarm in alarms]))
+        # SLO graphs with the alarm threshold or the expected band drawn in
+        slo_graphs = [
+            cloud_watch.AlarmWidget(alarm=alarm, title=title, width=12)
+            for title, alarm in threshold_widgets
+        ] + anomaly_graphs
+        if slo_graphs:
+            dashboard.add_widgets(*slo_graphs)
+
+    def add_request_anomaly_alarm(self, slo: SloConfig, api_name: str,
+                                  stage: str) -> cloud_watch.IAlarm:
+        # The L2 Alarm has no anomaly detection support, so the model and
+        # the band alarm are declared with the L1 resources
+        api_dimensions = self.api_dimensions(api_name, stage)
+        dimensions = [
+            cloud_watch.CfnAnomalyDetector.DimensionProperty(name=name,
+                                                             value=value)
+            for name, value in api_dimensions.items()
+        ]
+        detector = cloud_watch.CfnAnomalyDetector(self,
+                                                  "RequestCountAnomalyDetector",
+                                                  namespace="AWS/ApiGateway",
+                                                  metric_name="Count",
+                                                  dimensions=dimensions,
+                                                  stat="Sum")
+
+        alarm = cloud_watch.CfnAlarm(
+            self,
+            "RequestCountAnomalyAlarm",
+            alarm_name=f"{slo.slo_service_name}-api-request-anomaly",
+            alarm_description=("API request count outside the expected band "
+                               f"of {slo.slo_request_anomaly_band} standard "
+                               "deviations"),
+            comparison_operator="LessThanLowerOrGreaterThanUpperThreshold",
+            evaluation_periods=slo.slo_evaluation_periods,
+            datapoints_to_alarm=slo.slo_datapoints_to_alarm,
+            threshold_metric_id="band",
+            treat_missing_data="notBreaching",
+            metrics=[
+                cloud_watch.CfnAlarm.MetricDataQueryProperty(
+                    id="requests",
+                    return_data=True,
+                    metric_stat=cloud_watch.CfnAlarm.MetricStatProperty(
+                        metric=cloud_watch.CfnAlarm.MetricProperty(
+                            namespace="AWS/ApiGateway",
+                            metric_name="Count",
+                            dimensions=[
+                                cloud_watch.CfnAlarm.DimensionProperty(
+                                    name=name, value=value)
+                                for name, value in api_dimensions.items()
+                            ]),
+                        period=slo.slo_period,
+                        stat="Sum")),
+                cloud_watch.CfnAlarm.MetricDataQueryProperty(
+                    id="band",
+                    return_data=True,
+                    expression=("ANOMALY_DETECTION_BAND(requests, "
+                                f"{slo.slo_request_anomaly_band})")),
+            ])
+        alarm.add_depends_on(detector)
+
+        return cloud_watch.Alarm.from_alarm_arn(self, "RequestCountAnomaly",
+                                                alarm.attr_arn)
+
+    @property
+    def main_slo_composite_alarms(self) -> dict:
+        return self.slo_composite_alarms
+
+    def api_dimensions(self, api_name: str, stage: str) -> dict:
+        if self.http_api_id:
+            return {"ApiId": self.http_api_id, "Stage": stage}
+        return {"ApiName": api_name, "Stage": stage}
+
     @jsii.implements(cloud_watch.IMetric)
     def metric_for_api_gw(self,
                           api_name: str,
@@ -159,10 +548,45 @@ class CloudwatchDashboardConstruct(core.Construct):
                           metric_name: str,
                           label: str,
                           stat: str = 'avg'):
-        return self.build_metric(metric_name, "AWS/ApiGateway", {
-            "ApiName": api_name,
-            "Stage": stage
-        }, cloud_watch.Unit.COUNT, label, stat)
+        if self.http_api_id:
+            metric_name = HTTP_API_METRIC_NAMES.get(metric_name, metric_name)
+        return self.build_metric(metric_name, "AWS/ApiGateway",
+                                 self.api_dimensions(api_name, stage),
+                                 cloud_watch.Unit.COUNT, label, stat,
+                                 self.period)
+
+    def metric_for_access_log(self, namespace: str, metric_name: str,
+                              stat: str) -> cloud_watch.MathExpression:
+        # Routes and statuses are only known once traffic arrives, one
+        # SEARCH graphs every combination
+        query = f'{{"{namespace}",Resource,Status}} MetricName="{metric_name}"'
+        return cloud_watch.MathExpression(
+            expression=f"SEARCH('{query}', '{stat}', {self.period})",
+            label="${PROP('Dim.Resource')} ${PROP('Dim.Status')}",
+            using_metrics={},
+            period=core.Duration.seconds(self.period))
+
+    @jsii.implements(cloud_watch.IMetric)
+    def metric_for_dax(self,
+                       cluster_name: str,
+                       metric_name: str,
+                       label: str,
+                       stat: str = 'sum'):
+        return self.build_metric(metric_name, "AWS/DAX",
+                                 {"ClusterId": cluster_name},
+                                 cloud_watch.Unit.COUNT, label, stat,
+                                 self.period)
+
+    @jsii.implements(cloud_watch.IMetric)
+    def metric_for_insights(self,
+                            function_name: str,
+                            metric_name: str,
+                            label: str,
+                            unit: cloud_watch.Unit,
+                            stat: str = 'p99'):
+        return self.build_metric(metric_name, "LambdaInsights",
+                                 {"function_name": function_name}, unit,
+                                 label, stat, self.metric_period)
 
     @staticmethod
     def build_metric(metric_name: str,
@@ -171,7 +595,7 @@ class CloudwatchDashboardConstruct(core.Construct):
                      unit: cloud_watch.Unit,
                      label: str,
                      stat: str = 'avg',
-                     period: int = 900):
+                     period: int = DEFAULT_API_PERIOD_SECONDS):
         return cloud_watch.Metric(metric_name=metric_name,
                                   namespace=name_space,
                                   dimensions=dimensions,
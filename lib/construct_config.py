@@ -0,0 +1,1453 @@
+import difflib
+import re
+import typing
+import weakref
+from dataclasses import dataclass, field, fields, is_dataclass, MISSING
+
+from .capacity_planner import plan_capacity
+
+# Enum mapping tables, context value -> CDK enum member name. Constructs
+# resolve the member with getattr so this module loads no jsii assembly.
+BILLING_MODES = {
+    "provisioned": "PROVISIONED",
+    "pay_per_request": "PAY_PER_REQUEST",
+    "on_demand": "PAY_PER_REQUEST",
+}
+ATTRIBUTE_TYPES = {
+    "string": "STRING",
+    "number": "NUMBER",
+    "binary": "BINARY",
+}
+PROJECTION_TYPES = {
+    "all": "ALL",
+    "keys_only": "KEYS_ONLY",
+    "keys": "KEYS_ONLY",
+}
+DEDUPLICATION_SCOPES = {
+    "queue": "queue",
+    "message_group": "messageGroup",
+}
+FIFO_THROUGHPUT_LIMITS = {
+    "per_queue": "perQueue",
+    "per_message_group_id": "perMessageGroupId",
+}
+ENCRYPTION_PROFILES = {
+    "kms_managed": "KMS_MANAGED",
+    "kms_optimized": "KMS_OPTIMIZED",
+    "service_managed": "SERVICE_MANAGED",
+}
+CONSISTENCY_MODES = {
+    "eventual": "EVENTUAL",
+    "strong": "STRONG",
+    "transactional": "TRANSACTIONAL",
+}
+INDEX_PROJECTION_TYPES = dict(PROJECTION_TYPES, include="INCLUDE")
+PASSTHROUGH_BEHAVIORS = {
+    "WHEN_NO_TEMPLATES": "WHEN_NO_TEMPLATES",
+    "WHEN_NO_MATCH": "WHEN_NO_MATCH",
+    "NEVER": "NEVER",
+}
+QUOTA_PERIODS = {
+    "day": "DAY",
+    "week": "WEEK",
+    "month": "MONTH",
+}
+API_TYPES = {
+    "rest": "REST",
+    "http": "HTTP",
+}
+JSON_SCHEMA_TYPES = {
+    schema_type: schema_type.upper()
+    for schema_type in ("string", "number", "integer", "boolean", "object",
+                        "array", "null")
+}
+ENDPOINT_TYPES = {
+    "regional": "REGIONAL",
+    "edge": "EDGE",
+}
+CACHE_CLUSTER_SIZES = {
+    size: size
+    for size in ("0.5", "1.6", "6.1", "13.5", "28.4", "58.2", "118", "237")
+}
+UNAUTHORIZED_CACHE_CONTROL_STRATEGIES = {
+    strategy: strategy
+    for strategy in ("FAIL_WITH_403", "SUCCEED_WITH_RESPONSE_HEADER",
+                     "SUCCEED_WITHOUT_RESPONSE_HEADER")
+}
+ALLOWED_METHODS = {
+    "ALLOW_GET_HEAD": "ALLOW_GET_HEAD",
+    "ALLOW_GET_HEAD_OPTIONS": "ALLOW_GET_HEAD_OPTIONS",
+    "ALLOW_ALL": "ALLOW_ALL",
+}
+VIEWER_PROTOCOL_POLICIES = {
+    "REDIRECT_TO_HTTPS": "REDIRECT_TO_HTTPS",
+    "HTTPS_ONLY": "HTTPS_ONLY",
+    "ALLOW_ALL": "ALLOW_ALL",
+}
+TRACING_MODES = {
+    "active": "ACTIVE",
+    "pass_through": "PASS_THROUGH",
+    "disabled": "DISABLED",
+}
+ARCHITECTURES = {
+    "x86_64": "x86_64",
+    "arm64": "arm64",
+}
+STREAM_VIEW_TYPES = {
+    "keys_only": "KEYS_ONLY",
+    "new_image": "NEW_IMAGE",
+    "old_image": "OLD_IMAGE",
+    "new_and_old_images": "NEW_AND_OLD_IMAGES",
+}
+STARTING_POSITIONS = {
+    "trim_horizon": "TRIM_HORIZON",
+    "latest": "LATEST",
+}
+DEPLOYMENT_TYPES = {
+    "canary": "CANARY",
+    "linear": "LINEAR",
+    "all_at_once": "ALL_AT_ONCE",
+}
+PRICE_CLASSES = {
+    "PRICE_CLASS_ALL": "PRICE_CLASS_ALL",
+    "PRICE_CLASS_200": "PRICE_CLASS_200",
+    "PRICE_CLASS_100": "PRICE_CLASS_100",
+}
+
+# Limits checked at synth
+SQS_MAX_BATCH_SIZE = 10000
+SQS_MAX_BATCH_SIZE_WITHOUT_WINDOW = 10
+SQS_MAX_BATCHING_WINDOW_SECONDS = 300
+SQS_MAX_FIFO_BATCH_SIZE = 10
+SQS_MAX_DELIVERY_DELAY_SECONDS = 900
+SQS_MAX_RECEIVE_WAIT_SECONDS = 20
+SQS_MAX_VISIBILITY_TIMEOUT_SECONDS = 43200
+SQS_MIN_RETENTION_SECONDS = 60
+SQS_MAX_RETENTION_SECONDS = 1209600
+STREAM_MAX_BATCH_SIZE = 10000
+STREAM_MAX_BATCHING_WINDOW_SECONDS = 300
+STREAM_MAX_PARALLELIZATION_FACTOR = 10
+STREAM_MAX_TUMBLING_WINDOW_SECONDS = 900
+STREAM_MAX_RECORD_AGE_SECONDS = 604800
+SQS_MIN_DATA_KEY_REUSE_SECONDS = 60
+SQS_DEFAULT_DATA_KEY_REUSE_SECONDS = 300
+SQS_MAX_DATA_KEY_REUSE_SECONDS = 86400
+METRIC_MATH_MAX_SERIES = 500
+SEARCH_QUERY_MAX_LENGTH = 1024
+API_MAX_COMPRESSION_SIZE = 10485760
+DDB_MAX_GLOBAL_INDEXES = 20
+DDB_MAX_LOCAL_INDEXES = 5
+DDB_MAX_PROJECTED_ATTRIBUTES = 100
+DDB_MAX_ITEM_SIZE_KB = 400
+
+# Fleet dashboard sections
+FLEET_SERVICES = ("api", "lambda", "dynamodb", "sqs")
+
+# X-Ray and Lambda Insights
+XRAY_RULE_NAME_MAX_LENGTH = 32
+EMF_MAX_DIMENSIONS = 30
+# Default Lambda Insights layer versions, published versions differ by
+# region, so fn_insights_layer_version has to be set in regions where these
+# do not match
+LAMBDA_INSIGHTS_LAYER_VERSION = 14
+LAMBDA_INSIGHTS_ARM64_LAYER_VERSION = 1
+
+# Lambda sizing limits
+LAMBDA_MIN_MEMORY_MB = 128
+LAMBDA_MAX_MEMORY_MB = 10240
+LAMBDA_MIN_EPHEMERAL_STORAGE_MB = 512
+LAMBDA_MAX_EPHEMERAL_STORAGE_MB = 10240
+
+# Static site deployment defaults
+HASHED_FILE_PATTERN = r"[.-][0-9a-f]{8,}\.\w+$"
+DEFAULT_CACHE_CONTROL = "public, max-age=0, must-revalidate"
+SITE_MANIFEST_KEY = ".site-manifest.json"
+SECURITY_HEADERS = {
+    "strict-transport-security": "max-age=63072000; includeSubDomains",
+    "x-content-type-options": "nosniff",
+    "x-frame-options": "DENY",
+    "referrer-policy": "strict-origin-when-cross-origin",
+}
+
+# API Gateway access log metrics, metric name: (log field, unit)
+ACCESS_LOG_METRICS = {
+    "ResponseLatency": ("responseLatency", "Milliseconds"),
+    "IntegrationLatency": ("integrationLatency", "Milliseconds"),
+    "ResponseBytes": ("responseLength", "Bytes"),
+}
+# Log field holding the route, by API type
+ACCESS_LOG_RESOURCE_FIELDS = {"REST": "resourcePath", "HTTP": "routeKey"}
+
+
+class ConfigError(ValueError):
+    def __init__(self, context_key: str, errors: typing.List[str]) -> None:
+        self.context_key = context_key
+        self.errors = errors
+        super().__init__(f"Invalid context '{context_key}':\n" +
+                         "\n".join(f"  - {error}" for error in errors))
+
+
+def choice(choices: typing.Dict[str, str], **kwargs):
+    return field(metadata={"choices": choices}, **kwargs)
+
+
+def slotted(cls):
+    # dataclass(slots=True) needs python 3.10, rebuild the class instead
+    cls_dict = dict(cls.__dict__)
+    field_names = tuple(f.name for f in fields(cls))
+    for name in field_names:
+        cls_dict.pop(name, None)
+    cls_dict.pop("__dict__", None)
+    cls_dict.pop("__weakref__", None)
+    cls_dict["__slots__"] = field_names
+    return type(cls)(cls.__name__, cls.__bases__, cls_dict)
+
+
+class BaseConfig:
+    __slots__ = ()
+
+    def validate(self) -> typing.List[str]:
+        return []
+
+
+###
+# Nested blocks
+###
+
+
+@slotted
+@dataclass(frozen=True)
+class ScheduleWindowConfig(BaseConfig):
+    name: str
+    schedule: str
+    min_capacity: typing.Optional[int] = None
+    max_capacity: typing.Optional[int] = None
+
+    def validate(self) -> typing.List[str]:
+        if self.min_capacity is None and self.max_capacity is None:
+            return [f"{self.name}: min_capacity or max_capacity is required"]
+        return []
+
+
+@slotted
+@dataclass(frozen=True)
+class SamplingRuleConfig(BaseConfig):
+    name: str
+    priority: int
+    fixed_rate: float
+    reservoir_size: int
+    service_name: typing.Optional[str] = None
+    service_type: str = "*"
+    host: str = "*"
+    http_method: str = "*"
+    url_path: str = "*"
+
+    def validate(self) -> typing.List[str]:
+        errors = []
+        if len(self.name) > XRAY_RULE_NAME_MAX_LENGTH:
+            errors.append(f"{self.name}: name is longer than "
+                          f"{XRAY_RULE_NAME_MAX_LENGTH} characters")
+        if not 1 <= self.priority <= 9999:
+            errors.append(f"{self.name}: priority must be between 1 and 9999")
+        if not 0 <= self.fixed_rate <= 1:
+            errors.append(f"{self.name}: fixed_rate must be between 0 and 1")
+        if self.reservoir_size < 0:
+            errors.append(f"{self.name}: reservoir_size must not be negative")
+        return errors
+
+
+@slotted
+@dataclass(frozen=True)
+class EmfMetricConfig(BaseConfig):
+    name: str
+    stat: str = "p99"
+    label: typing.Optional[str] = None
+
+
+@slotted
+@dataclass(frozen=True)
+class MethodCacheOverrideConfig(BaseConfig):
+    enabled: bool = True
+    ttl: typing.Optional[int] = None
+
+    def validate(self) -> typing.List[str]:
+        if self.ttl is not None and not 0 <= self.ttl <= 3600:
+            return ["ttl must be between 0 and 3600 seconds"]
+        return []
+
+
+@slotted
+@dataclass(frozen=True)
+class MethodThrottleConfig(BaseConfig):
+    rate_limit: float
+    burst_limit: int
+
+    def validate(self) -> typing.List[str]:
+        errors = []
+        if self.rate_limit < 0:
+            errors.append("rate_limit must not be negative")
+        if self.burst_limit < 0:
+            errors.append("burst_limit must not be negative")
+        return errors
+
+
+@slotted
+@dataclass(frozen=True)
+class UsagePlanTierConfig(BaseConfig):
+    name: str
+    rate_limit: float
+    burst_limit: int
+    api_keys: typing.List[str]
+    quota_limit: typing.Optional[int] = None
+    quota_period: str = choice(QUOTA_PERIODS, default="MONTH")
+    # Keyed by method path, /resource/METHOD
+    method_throttles: typing.Dict[str, MethodThrottleConfig] = field(
+        default_factory=dict)
+
+    def validate(self) -> typing.List[str]:
+        errors = []
+        if self.rate_limit < 0:
+            errors.append("rate_limit must not be negative")
+        if self.burst_limit < 0:
+            errors.append("burst_limit must not be negative")
+        if not self.api_keys:
+            errors.append("api_keys needs at least one key name")
+        if self.quota_limit is not None and self.quota_limit < 1:
+            errors.append("quota_limit must be at least 1")
+        return errors
+
+
+@slotted
+@dataclass(frozen=True)
+class TrafficProfileConfig(BaseConfig):
+    reads_per_second: float
+    writes_per_second: float
+    item_size_kb: float = 1.0
+    read_consistency: str = choice(CONSISTENCY_MODES, default="EVENTUAL")
+    transactional_writes: bool = False
+    peak_multiplier: float = 2.0
+
+    def validate(self) -> typing.List[str]:
+        errors = []
+        if self.reads_per_second < 0 or self.writes_per_second < 0:
+            errors.append("reads_per_second and writes_per_second must not "
+                          "be negative")
+        if not 0 < self.item_size_kb <= DDB_MAX_ITEM_SIZE_KB:
+            errors.append("item_size_kb must be greater than 0 and at most "
+                          f"{DDB_MAX_ITEM_SIZE_KB}")
+        if self.peak_multiplier < 1:
+            errors.append("peak_multiplier must be at least 1")
+        return errors
+
+
+def _index_errors(name: str, projection: str,
+                 non_key_attributes: typing.List[str]) -> typing.List[str]:
+    errors = []
+    if not re.match(r"^[A-Za-z0-9_.-]{3,255}$", name):
+        errors.append(f"{name}: index names are 3 to 255 letters, digits, "
+                      "'_', '-' or '.'")
+    if projection == "INCLUDE" and not non_key_attributes:
+        errors.append(f"{name}: non_key_attributes is required with the "
+                      "include projection")
+    if projection != "INCLUDE" and non_key_attributes:
+        errors.append(f"{name}: non_key_attributes only applies to the "
+                      "include projection")
+    if len(set(non_key_attributes)) != len(non_key_attributes):
+        errors.append(f"{name}: non_key_attributes has duplicates")
+    return errors
+
+
+@slotted
+@dataclass(frozen=True)
+class GlobalIndexConfig(BaseConfig):
+    name: str
+    partition_key: str
+    partition_key_type: str = choice(ATTRIBUTE_TYPES, default="STRING")
+    sort_key: typing.Optional[str] = None
+    sort_key_type: str = choice(ATTRIBUTE_TYPES, default="STRING")
+    projection: str = choice(INDEX_PROJECTION_TYPES, default="ALL")
+    non_key_attributes: typing.List[str] = field(default_factory=list)
+    min_read_capacity: typing.Optional[int] = None
+    max_read_capacity: typing.Optional[int] = None
+    min_write_capacity: typing.Optional[int] = None
+    max_write_capacity: typing.Optional[int] = None
+    target_utilization: typing.Optional[float] = None
+    traffic: typing.Optional[TrafficProfileConfig] = None
+
+    def validate(self) -> typing.List[str]:
+        errors = _index_errors(self.name, self.projection,
+                               self.non_key_attributes)
+        if self.target_utilization is not None and \
+                not 10 <= self.target_utilization <= 90:
+            errors.append(f"{self.name}: target_utilization must be between "
+                          "10 and 90")
+        return errors
+
+
+@slotted
+@dataclass(frozen=True)
+class LocalIndexConfig(BaseConfig):
+    name: str
+    sort_key: str
+    sort_key_type: str = choice(ATTRIBUTE_TYPES, default="STRING")
+    projection: str = choice(INDEX_PROJECTION_TYPES, default="ALL")
+    non_key_attributes: typing.List[str] = field(default_factory=list)
+
+    def validate(self) -> typing.List[str]:
+        return _index_errors(self.name, self.projection,
+                             self.non_key_attributes)
+
+
+@slotted
+@dataclass(frozen=True)
+class ModelPropertyConfig(BaseConfig):
+    type: str = choice(JSON_SCHEMA_TYPES, default="STRING")
+    max_length: typing.Optional[int] = None
+    pattern: typing.Optional[str] = None
+
+    def validate(self) -> typing.List[str]:
+        errors = []
+        if self.type != "STRING" and (self.max_length is not None
+                                      or self.pattern is not None):
+            errors.append("max_length and pattern only apply to string "
+                          "properties")
+        if self.max_length is not None and self.max_length < 0:
+            errors.append("max_length must not be negative")
+        if self.pattern is not None:
+            try:
+                re.compile(self.pattern)
+            except re.error as err:
+                errors.append(f"pattern '{self.pattern}' is not a valid "
+                              f"regex: {err}")
+        return errors
+
+
+@slotted
+@dataclass(frozen=True)
+class RequestModelConfig(BaseConfig):
+    name: str
+    properties: typing.Dict[str, ModelPropertyConfig]
+    required: typing.List[str] = field(default_factory=list)
+    content_type: str = "application/json"
+    additional_properties: bool = True
+
+    def validate(self) -> typing.List[str]:
+        errors = []
+        if not re.match(r"^[A-Za-z0-9]+$", self.name):
+            errors.append(f"{self.name}: name must be alphanumeric")
+        errors += [
+            f"required: '{name}' is not one of the properties"
+            for name in self.required if name not in self.properties
+        ]
+        return errors
+
+
+@slotted
+@dataclass(frozen=True)
+class CachePolicyConfig(BaseConfig):
+    min_ttl: int
+    default_ttl: int
+    max_ttl: int
+    query_strings: typing.List[str] = field(default_factory=list)
+    cookies: typing.List[str] = field(default_factory=list)
+    headers: typing.List[str] = field(default_factory=list)
+    comment: typing.Optional[str] = None
+
+    def validate(self) -> typing.List[str]:
+        if not self.min_ttl <= self.default_ttl <= self.max_ttl:
+            return ["ttls must satisfy min_ttl <= default_ttl <= max_ttl"]
+        return []
+
+
+@slotted
+@dataclass(frozen=True)
+class OriginRequestPolicyConfig(BaseConfig):
+    query_strings: typing.List[str] = field(default_factory=list)
+    cookies: typing.List[str] = field(default_factory=list)
+    headers: typing.List[str] = field(default_factory=list)
+    comment: typing.Optional[str] = None
+
+
+@slotted
+@dataclass(frozen=True)
+class BehaviorConfig(BaseConfig):
+    path_pattern: str
+    cache_policy: CachePolicyConfig
+    origin_request_policy: typing.Optional[OriginRequestPolicyConfig] = None
+
+
+@slotted
+@dataclass(frozen=True)
+class CacheControlRuleConfig(BaseConfig):
+    pattern: str
+    cache_control: str
+
+    def validate(self) -> typing.List[str]:
+        try:
+            re.compile(self.pattern)
+        except re.error as err:
+            return [f"pattern '{self.pattern}' is not a valid regex: {err}"]
+        return []
+
+
+###
+# Construct contexts
+###
+
+
+@slotted
+@dataclass(frozen=True)
+class LambdaConfig(BaseConfig):
+    fn_name: str
+    fn_dlq_name: str
+    fn_handler: str
+    fn_path: str
+    fn_retry_attempts: int
+    fn_timeout: int
+    fn_reserved_concurrency: typing.Optional[int]
+    fn_alias: str
+    fn_provisioned_concurrency: int = 0
+    fn_pc_autoscaling: bool = False
+    fn_pc_min_capacity: typing.Optional[int] = None
+    fn_pc_max_capacity: typing.Optional[int] = None
+    fn_pc_target_utilization: float = 0.7
+    fn_pc_schedules: typing.List[ScheduleWindowConfig] = field(
+        default_factory=list)
+    fn_tracing: str = choice(TRACING_MODES, default="ACTIVE")
+    fn_sampling_rules: typing.List[SamplingRuleConfig] = field(
+        default_factory=list)
+    fn_insights: bool = False
+    # Defaults to LAMBDA_INSIGHTS_LAYER_VERSION in every region
+    fn_insights_layer_version: typing.Optional[int] = None
+    fn_insights_layer_arn: typing.Optional[str] = None
+    fn_emf_namespace: typing.Optional[str] = None
+    fn_emf_dimensions: typing.Dict[str, str] = field(default_factory=dict)
+    fn_emf_metrics: typing.List[EmfMetricConfig] = field(default_factory=list)
+    fn_memory_size: typing.Optional[int] = None
+    # Typical invocation duration, used to size the API usage plans
+    fn_expected_duration_ms: typing.Optional[float] = None
+    fn_ephemeral_storage: typing.Optional[int] = None
+    fn_architecture: typing.Optional[str] = choice(ARCHITECTURES, default=None)
+    fn_deployment_type: typing.Optional[str] = choice(DEPLOYMENT_TYPES,
+                                                      default=None)
+    fn_deployment_percentage: int = 10
+    fn_deployment_interval: int = 5
+    fn_deployment_error_threshold: int = 0
+    fn_deployment_p99_duration_ms: typing.Optional[float] = None
+    fn_deployment_evaluation_periods: int = 2
+    fn_bundling: bool = False
+    fn_requirements: typing.Optional[str] = None
+    fn_bundle_exclude: typing.List[str] = field(default_factory=list)
+    # Paths in installed packages that stay in the layer when stripped
+    fn_bundle_keep: typing.List[str] = field(default_factory=list)
+    fn_bundle_precompile: bool = True
+    fn_bundle_cache_dir: typing.Optional[str] = None
+
+    def validate(self) -> typing.List[str]:
+        errors = []
+        if self.fn_memory_size is not None and not \
+                LAMBDA_MIN_MEMORY_MB <= self.fn_memory_size <= LAMBDA_MAX_MEMORY_MB:
+            errors.append(f"fn_memory_size must be between "
+                          f"{LAMBDA_MIN_MEMORY_MB} and {LAMBDA_MAX_MEMORY_MB}")
+        if self.fn_ephemeral_storage is not None and not \
+                LAMBDA_MIN_EPHEMERAL_STORAGE_MB <= self.fn_ephemeral_storage \
+                <= LAMBDA_MAX_EPHEMERAL_STORAGE_MB:
+            errors.append(f"fn_ephemeral_storage must be between "
+                          f"{LAMBDA_MIN_EPHEMERAL_STORAGE_MB} and "
+                          f"{LAMBDA_MAX_EPHEMERAL_STORAGE_MB}")
+        if self.fn_expected_duration_ms is not None and not \
+                0 < self.fn_expected_duration_ms <= self.fn_timeout * 1000:
+            errors.append("fn_expected_duration_ms must be greater than 0 "
+                          "and at most fn_timeout")
+        if self.fn_requirements and not self.fn_bundling:
+            errors.append("fn_requirements is only used with fn_bundling")
+        if self.fn_deployment_type in ("CANARY", "LINEAR"):
+            if not 1 <= self.fn_deployment_percentage <= 99:
+                errors.append(
+                    "fn_deployment_percentage must be between 1 and 99")
+            if self.fn_deployment_interval < 1:
+                errors.append("fn_deployment_interval must be at least 1 "
+                              "minute")
+        names = [rule.name for rule in self.fn_sampling_rules]
+        errors += [
+            f"fn_sampling_rules: duplicate name '{name}'"
+            for name in sorted(set(names)) if names.count(name) > 1
+        ]
+        if (self.fn_emf_dimensions or self.fn_emf_metrics) and \
+                not self.fn_emf_namespace:
+            errors.append("fn_emf_namespace is required with "
+                          "fn_emf_dimensions or fn_emf_metrics")
+        if len(self.fn_emf_dimensions) > EMF_MAX_DIMENSIONS:
+            errors.append(f"fn_emf_dimensions has more than "
+                          f"{EMF_MAX_DIMENSIONS} dimensions")
+        if not self.fn_provisioned_concurrency:
+            return errors
+
+        # Every capacity the alias can reach has to fit in the reservation
+        capacities = {
+            "fn_provisioned_concurrency": self.fn_provisioned_concurrency
+        }
+        if self.fn_pc_autoscaling:
+            if self.fn_pc_max_capacity is None:
+                errors.append(
+                    "fn_pc_max_capacity is required with fn_pc_autoscaling")
+            else:
+                capacities["fn_pc_max_capacity"] = self.fn_pc_max_capacity
+            capacities["fn_pc_min_capacity"] = self.pc_min_capacity
+            for window in self.fn_pc_schedules:
+                for bound in ("min_capacity", "max_capacity"):
+                    if getattr(window, bound) is not None:
+                        capacities[window.name + "." +
+                                   bound] = getattr(window, bound)
+
+        if capacities.get("fn_pc_min_capacity",
+                          0) > capacities.get("fn_pc_max_capacity",
+                                              float("inf")):
+            errors.append(
+                "fn_pc_min_capacity is greater than fn_pc_max_capacity")
+
+        if self.fn_reserved_concurrency is not None:
+            over = [
+                f"{key}={value}" for key, value in capacities.items()
+                if value > self.fn_reserved_concurrency
+            ]
+            if over:
+                errors.append(
+                    "provisioned concurrency exceeds fn_reserved_concurrency="
+                    f"{self.fn_reserved_concurrency} ({', '.join(over)})")
+        return errors
+
+    @property
+    def pc_min_capacity(self) -> int:
+        if self.fn_pc_min_capacity is None:
+            return self.fn_provisioned_concurrency
+        return self.fn_pc_min_capacity
+
+
+@slotted
+@dataclass(frozen=True)
+class QueueConfig(BaseConfig):
+    queue_name: str
+    queue_dlq_name: str
+    queue_dlq_max_receive_count: int
+    queue_consumer_batch_size: int = 10
+    queue_consumer_max_batching_window: int = 0
+    queue_consumer_max_concurrency: typing.Optional[int] = None
+    queue_consumer_report_batch_item_failures: bool = False
+    queue_delivery_delay: int = 15
+    queue_visibility_timeout: int = 30
+    queue_retention_period: int = 50400
+    # Long polling, receives wait for messages instead of returning empty
+    queue_receive_wait_time: int = SQS_MAX_RECEIVE_WAIT_SECONDS
+    queue_fifo: bool = False
+    queue_content_based_deduplication: bool = False
+    queue_deduplication_scope: typing.Optional[str] = choice(
+        DEDUPLICATION_SCOPES, default=None)
+    queue_fifo_throughput_limit: typing.Optional[str] = choice(
+        FIFO_THROUGHPUT_LIMITS, default=None)
+
+    def validate(self) -> typing.List[str]:
+        errors = self.queue_errors()
+        batch_size = self.queue_consumer_batch_size
+        batching_window = self.queue_consumer_max_batching_window
+        max_concurrency = self.queue_consumer_max_concurrency
+        if not 1 <= batch_size <= SQS_MAX_BATCH_SIZE:
+            errors.append(f"queue_consumer_batch_size must be between 1 and "
+                          f"{SQS_MAX_BATCH_SIZE}")
+        if batch_size > SQS_MAX_BATCH_SIZE_WITHOUT_WINDOW and not batching_window:
+            errors.append("queue_consumer_max_batching_window is required "
+                          "when queue_consumer_batch_size is above "
+                          f"{SQS_MAX_BATCH_SIZE_WITHOUT_WINDOW}")
+        if not 0 <= batching_window <= SQS_MAX_BATCHING_WINDOW_SECONDS:
+            errors.append("queue_consumer_max_batching_window must be between "
+                          f"0 and {SQS_MAX_BATCHING_WINDOW_SECONDS} seconds")
+        if max_concurrency is not None and not 2 <= max_concurrency <= 1000:
+            errors.append(
+                "queue_consumer_max_concurrency must be between 2 and 1000")
+        if self.queue_fifo and batch_size > SQS_MAX_FIFO_BATCH_SIZE:
+            errors.append("queue_consumer_batch_size must be at most "
+                          f"{SQS_MAX_FIFO_BATCH_SIZE} on a FIFO queue")
+        if self.queue_fifo and batching_window:
+            errors.append("queue_consumer_max_batching_window is not "
+                          "supported on a FIFO queue")
+        return errors
+
+    def queue_errors(self) -> typing.List[str]:
+        errors = []
+        if not 0 <= self.queue_delivery_delay <= \
+                SQS_MAX_DELIVERY_DELAY_SECONDS:
+            errors.append("queue_delivery_delay must be between 0 and "
+                          f"{SQS_MAX_DELIVERY_DELAY_SECONDS} seconds")
+        if not 0 <= self.queue_visibility_timeout <= \
+                SQS_MAX_VISIBILITY_TIMEOUT_SECONDS:
+            errors.append("queue_visibility_timeout must be between 0 and "
+                          f"{SQS_MAX_VISIBILITY_TIMEOUT_SECONDS} seconds")
+        if not SQS_MIN_RETENTION_SECONDS <= self.queue_retention_period <= \
+                SQS_MAX_RETENTION_SECONDS:
+            errors.append("queue_retention_period must be between "
+                          f"{SQS_MIN_RETENTION_SECONDS} and "
+                          f"{SQS_MAX_RETENTION_SECONDS} seconds")
+        if not 0 <= self.queue_receive_wait_time <= \
+                SQS_MAX_RECEIVE_WAIT_SECONDS:
+            errors.append("queue_receive_wait_time must be between 0 and "
+                          f"{SQS_MAX_RECEIVE_WAIT_SECONDS} seconds")
+        if not self.queue_fifo:
+            errors += [
+                f"{name} requires queue_fifo"
+                for name in ("queue_content_based_deduplication",
+                             "queue_deduplication_scope",
+                             "queue_fifo_throughput_limit")
+                if getattr(self, name)
+            ]
+        # Throughput is only split per message group when deduplication is
+        # scoped to the group too
+        if self.queue_fifo_throughput_limit == "perMessageGroupId" and \
+                self.queue_deduplication_scope != "messageGroup":
+            errors.append("queue_fifo_throughput_limit per_message_group_id "
+                          "requires queue_deduplication_scope message_group")
+        return errors
+
+    def physical_name(self, name: str) -> str:
+        # FIFO queue names have to end in .fifo
+        if self.queue_fifo and not name.endswith(".fifo"):
+            return name + ".fifo"
+        return name
+
+
+@slotted
+@dataclass(frozen=True)
+class DbConfig(BaseConfig):
+    db_table: str
+    db_billing_mode: str = choice(BILLING_MODES)
+    db_table_pk: str = field()
+    db_table_pk_type: str = choice(ATTRIBUTE_TYPES)
+    db_table_sk: str = field()
+    db_table_sk_type: str = choice(ATTRIBUTE_TYPES)
+    db_gsi_projection: str = choice(PROJECTION_TYPES)
+    db_lsi_projection: str = choice(PROJECTION_TYPES)
+    db_enable_autoscaling: bool = field()
+    db_reverse_index: bool = field()
+    db_add_lsi: bool = field()
+    # Capacity is either set or planned from the expected traffic, set
+    # values win over planned ones
+    db_min_read_capacity: typing.Optional[int] = None
+    db_max_read_capacity: typing.Optional[int] = None
+    db_min_write_capacity: typing.Optional[int] = None
+    db_max_write_capacity: typing.Optional[int] = None
+    db_target_utilization: float = 70.0
+    db_traffic: typing.Optional[TrafficProfileConfig] = None
+    db_reverse_index_traffic: typing.Optional[TrafficProfileConfig] = None
+    db_dax_enabled: bool = False
+    db_dax_cluster_name: typing.Optional[str] = None
+    db_dax_node_type: typing.Optional[str] = None
+    db_dax_node_count: typing.Optional[int] = None
+    db_dax_item_ttl_ms: typing.Optional[int] = None
+    db_dax_query_ttl_ms: typing.Optional[int] = None
+    db_dax_subnet_ids: typing.List[str] = field(default_factory=list)
+    db_dax_security_group_ids: typing.List[str] = field(default_factory=list)
+    db_dax_vpc_id: typing.Optional[str] = None
+    db_dax_ingress_cidr: typing.Optional[str] = None
+    db_stream_view_type: typing.Optional[str] = choice(STREAM_VIEW_TYPES,
+                                                       default=None)
+    db_stream_starting_position: str = choice(STARTING_POSITIONS,
+                                              default="TRIM_HORIZON")
+    db_stream_batch_size: int = 100
+    db_stream_max_batching_window: int = 0
+    db_stream_parallelization_factor: int = 1
+    db_stream_tumbling_window: typing.Optional[int] = None
+    db_stream_bisect_on_error: bool = False
+    db_stream_retry_attempts: typing.Optional[int] = None
+    db_stream_max_record_age: typing.Optional[int] = None
+    db_stream_report_batch_item_failures: bool = False
+    db_stream_on_failure_queue_name: typing.Optional[str] = None
+    db_ttl_attribute: typing.Optional[str] = None
+    db_replica_regions: typing.List[str] = field(default_factory=list)
+    db_global_indexes: typing.List[GlobalIndexConfig] = field(
+        default_factory=list)
+    db_local_indexes: typing.List[LocalIndexConfig] = field(
+        default_factory=list)
+
+    def validate(self) -> typing.List[str]:
+        errors = self.capacity_errors()
+        errors += self.index_errors()
+        errors += self.stream_errors()
+        errors += self.replica_errors()
+        if self.db_dax_enabled:
+            for name in ("db_dax_cluster_name", "db_dax_node_type",
+                         "db_dax_node_count", "db_dax_item_ttl_ms",
+                         "db_dax_query_ttl_ms"):
+                if getattr(self, name) is None:
+                    errors.append(f"{name} is required with db_dax_enabled")
+            if not self.db_dax_subnet_ids:
+                errors.append("db_dax_subnet_ids is required with "
+                              "db_dax_enabled")
+            if not self.db_dax_security_group_ids and not (
+                    self.db_dax_vpc_id and self.db_dax_ingress_cidr):
+                errors.append("db_dax_security_group_ids or db_dax_vpc_id "
+                              "with db_dax_ingress_cidr is required with "
+                              "db_dax_enabled")
+        return errors
+
+    def index_errors(self) -> typing.List[str]:
+        errors = []
+
+        # The legacy flags build one index each
+        global_names = [index.name for index in self.db_global_indexes]
+        if self.db_reverse_index and self.sort_key:
+            global_names.append("reverseIndex")
+        local_names = [index.name for index in self.db_local_indexes]
+        if self.db_add_lsi:
+            local_names.append("LSI1")
+
+        if len(global_names) > DDB_MAX_GLOBAL_INDEXES:
+            errors.append(f"a table has at most {DDB_MAX_GLOBAL_INDEXES} "
+                          f"global secondary indexes, got {len(global_names)}")
+        if len(local_names) > DDB_MAX_LOCAL_INDEXES:
+            errors.append(f"a table has at most {DDB_MAX_LOCAL_INDEXES} "
+                          f"local secondary indexes, got {len(local_names)}")
+        if local_names and not self.sort_key:
+            errors.append("local secondary indexes need a table sort key")
+        names = global_names + local_names
+        errors += [
+            f"index name '{name}' is used more than once"
+            for name in sorted(set(names)) if names.count(name) > 1
+        ]
+
+        # Counted per index, the same attribute in two indexes counts twice
+        projected = sum(
+            len(index.non_key_attributes)
+            for index in self.db_global_indexes + self.db_local_indexes)
+        if projected > DDB_MAX_PROJECTED_ATTRIBUTES:
+            errors.append("non_key_attributes across all indexes exceed "
+                          f"{DDB_MAX_PROJECTED_ATTRIBUTES}, got {projected}")
+
+        # Every key attribute has a single type in the table definition
+        key_types = {self.db_table_pk: self.db_table_pk_type}
+        if self.sort_key:
+            key_types[self.sort_key] = self.db_table_sk_type
+        if self.db_add_lsi:
+            key_types.setdefault("LSISK", "STRING")
+        keys = [(index.partition_key, index.partition_key_type)
+                for index in self.db_global_indexes]
+        keys += [(index.sort_key, index.sort_key_type)
+                 for index in self.db_global_indexes + self.db_local_indexes
+                 if index.sort_key]
+        for name, key_type in keys:
+            if key_types.setdefault(name, key_type) != key_type:
+                errors.append(f"key attribute '{name}' is declared as both "
+                              f"{key_types[name].lower()} and "
+                              f"{key_type.lower()}")
+
+        if self.db_billing_mode == "PAY_PER_REQUEST":
+            errors += [
+                f"db_global_indexes: {index.name} sets capacity, on demand "
+                "tables have no provisioned capacity"
+                for index in self.db_global_indexes if any(
+                    getattr(index, name) is not None
+                    for name in ("min_read_capacity", "max_read_capacity",
+                                 "min_write_capacity", "max_write_capacity"))
+            ]
+        return errors
+
+    def stream_errors(self) -> typing.List[str]:
+        errors = []
+        if not 1 <= self.db_stream_batch_size <= STREAM_MAX_BATCH_SIZE:
+            errors.append("db_stream_batch_size must be between 1 and "
+                          f"{STREAM_MAX_BATCH_SIZE}")
+        if not 0 <= self.db_stream_max_batching_window <= \
+                STREAM_MAX_BATCHING_WINDOW_SECONDS:
+            errors.append("db_stream_max_batching_window must be between 0 "
+                          f"and {STREAM_MAX_BATCHING_WINDOW_SECONDS} seconds")
+        if not 1 <= self.db_stream_parallelization_factor <= \
+                STREAM_MAX_PARALLELIZATION_FACTOR:
+            errors.append("db_stream_parallelization_factor must be between 1 "
+                          f"and {STREAM_MAX_PARALLELIZATION_FACTOR}")
+        if self.db_stream_tumbling_window is not None and \
+                not 0 <= self.db_stream_tumbling_window <= \
+                STREAM_MAX_TUMBLING_WINDOW_SECONDS:
+            errors.append("db_stream_tumbling_window must be between 0 and "
+                          f"{STREAM_MAX_TUMBLING_WINDOW_SECONDS} seconds")
+        # Unset, failed batches are retried until the records expire
+        if self.db_stream_retry_attempts is not None and \
+                not 0 <= self.db_stream_retry_attempts <= 10000:
+            errors.append("db_stream_retry_attempts must be between 0 and "
+                          "10000")
+        max_record_age = self.db_stream_max_record_age
+        if max_record_age is not None and \
+                not 60 <= max_record_age <= STREAM_MAX_RECORD_AGE_SECONDS:
+            errors.append("db_stream_max_record_age must be between 60 and "
+                          f"{STREAM_MAX_RECORD_AGE_SECONDS} seconds")
+        return errors
+
+    def replica_errors(self) -> typing.List[str]:
+        errors = [
+            f"db_replica_regions: '{region}' is not a region name"
+            for region in self.db_replica_regions
+            if not re.match(r"^[a-z]{2}(-gov)?-[a-z]+-\d$", region)
+        ]
+        if len(set(self.db_replica_regions)) != len(self.db_replica_regions):
+            errors.append("db_replica_regions has duplicates")
+        if not self.db_replica_regions:
+            return errors
+
+        # Replication reads the table stream with both images
+        if self.db_stream_view_type not in (None, "NEW_AND_OLD_IMAGES"):
+            errors.append("db_stream_view_type must be new_and_old_images "
+                          "with db_replica_regions")
+        # Replicas share the write capacity, so provisioned global tables
+        # need write autoscaling on the table and every global index
+        if self.db_billing_mode == "PROVISIONED" and \
+                not self.db_enable_autoscaling:
+            errors.append("db_enable_autoscaling is required with "
+                          "db_replica_regions on a provisioned table")
+        return errors
+
+    def capacity_errors(self) -> typing.List[str]:
+        errors = []
+        if not 10 <= self.db_target_utilization <= 90:
+            errors.append("db_target_utilization must be between 10 and 90")
+            return errors
+        if self.db_billing_mode != "PROVISIONED":
+            return errors
+
+        if any(
+                self.table_capacity(limit, bound) is None
+                for limit in ("min", "max") for bound in ("read", "write")):
+            errors.append("db_traffic or db_min_read_capacity, "
+                          "db_max_read_capacity, db_min_write_capacity and "
+                          "db_max_write_capacity are required on a "
+                          "provisioned table")
+            return errors
+
+        # Unset index bounds fall back to the index traffic, then to the
+        # table ones
+        capacities = [("", "db_", self.table_capacity)]
+        if self.db_reverse_index and self.sort_key:
+            capacities.append(
+                ("reverseIndex ", "", self.reverse_index_capacity))
+        capacities += [
+            (f"db_global_indexes: {index.name} ", "",
+             lambda limit, bound, index=index: self.index_capacity(
+                 index, limit, bound)) for index in self.db_global_indexes
+        ]
+        for subject, prefix, capacity in capacities:
+            errors += [
+                f"{subject}{prefix}min_{bound}_capacity is greater than "
+                f"{prefix}max_{bound}_capacity" for bound in ("read", "write")
+                if capacity("min", bound) > capacity("max", bound)
+            ]
+        return errors
+
+    def table_capacity(self, limit: str, bound: str) -> typing.Optional[int]:
+        value = getattr(self, f"db_{limit}_{bound}_capacity")
+        if value is None and self.db_traffic:
+            plan = plan_capacity(self.db_traffic, self.db_target_utilization)
+            value = getattr(plan, f"{limit}_{bound}_capacity")
+        return value
+
+    def reverse_index_capacity(self, limit: str,
+                               bound: str) -> typing.Optional[int]:
+        if self.db_reverse_index_traffic:
+            plan = plan_capacity(self.db_reverse_index_traffic,
+                                 self.db_target_utilization)
+            return getattr(plan, f"{limit}_{bound}_capacity")
+        return self.table_capacity(limit, bound)
+
+    def index_capacity(self, index: GlobalIndexConfig, limit: str,
+                       bound: str) -> typing.Optional[int]:
+        value = getattr(index, f"{limit}_{bound}_capacity")
+        if value is None and index.traffic:
+            plan = plan_capacity(
+                index.traffic, index.target_utilization or
+                self.db_target_utilization)
+            value = getattr(plan, f"{limit}_{bound}_capacity")
+        if value is None:
+            value = self.table_capacity(limit, bound)
+        return value
+
+    @property
+    def sort_key(self) -> typing.Optional[str]:
+        return self.db_table_sk or None
+
+
+@slotted
+@dataclass(frozen=True)
+class GatewayConfig(BaseConfig):
+    gw_log_group_name: str
+    gw_name: str
+    gw_stage_description: str
+    gw_endpoint_type: str = choice(ENDPOINT_TYPES)
+    gw_description: str = field()
+    gw_response_model_name: str = field()
+    gw_error_response_model_name: str = field()
+    gw_passthrough_behavior: str = choice(PASSTHROUGH_BEHAVIORS)
+    gw_root_resource: str = field()
+    gw_method: str = field()
+    gw_origins_cors: str = field()
+    gw_origins_cors_method: str = field()
+    gw_api_key_name: str = field()
+    gw_api_key_usage_plan_name: str = field()
+    gw_api_key_usage_throttle: float = field()
+    gw_api_key_usage_burst: int = field()
+    gw_cache_enabled: bool = False
+    gw_cache_cluster_size: str = choice(CACHE_CLUSTER_SIZES, default="0.5")
+    gw_cache_ttl: int = 300
+    gw_cache_encrypted: bool = False
+    gw_cache_key_parameters: typing.List[str] = field(default_factory=list)
+    gw_cache_method_overrides: typing.Dict[
+        str, MethodCacheOverrideConfig] = field(default_factory=dict)
+    gw_cache_require_authorization: typing.Optional[bool] = None
+    gw_cache_unauthorized_strategy: str = choice(
+        UNAUTHORIZED_CACHE_CONTROL_STRATEGIES, default="FAIL_WITH_403")
+    gw_api_type: str = choice(API_TYPES, default="REST")
+    gw_http_detailed_metrics: bool = False
+    gw_request_model: typing.Optional[RequestModelConfig] = None
+    gw_request_parameters: typing.Dict[str, bool] = field(
+        default_factory=dict)
+    gw_minimum_compression_size: typing.Optional[int] = None
+    gw_binary_media_types: typing.List[str] = field(default_factory=list)
+    gw_access_log_latency: bool = False
+    gw_access_log_metrics: bool = False
+    gw_access_log_namespace: typing.Optional[str] = None
+    gw_access_log_queries: bool = False
+    gw_usage_plans: typing.List[UsagePlanTierConfig] = field(
+        default_factory=list)
+    # Stage throttles across every caller, keyed by /resource/METHOD
+    gw_method_throttles: typing.Dict[str, MethodThrottleConfig] = field(
+        default_factory=dict)
+
+    def validate(self) -> typing.List[str]:
+        errors = self.throttle_errors()
+        # HTTP API access logs always carry both latencies
+        if self.gw_api_type == "REST" and not self.gw_access_log_latency \
+                and (self.gw_access_log_metrics or self.gw_access_log_queries):
+            errors.append("gw_access_log_metrics and gw_access_log_queries "
+                          "need gw_access_log_latency with gw_api_type rest")
+        if self.gw_api_type == "HTTP" and self.gw_cache_enabled:
+            errors.append("gw_cache_enabled is only supported with "
+                          "gw_api_type rest, HTTP APIs have no stage cache")
+        if self.gw_api_type == "HTTP" and (
+                self.gw_request_model or self.gw_request_parameters or
+                self.gw_minimum_compression_size is not None or
+                self.gw_binary_media_types):
+            errors.append("request validation, compression and binary media "
+                          "types are only supported with gw_api_type rest")
+        if self.gw_minimum_compression_size is not None and \
+                not 0 <= self.gw_minimum_compression_size <= \
+                API_MAX_COMPRESSION_SIZE:
+            errors.append("gw_minimum_compression_size must be between 0 and "
+                          f"{API_MAX_COMPRESSION_SIZE} bytes")
+        if not 0 <= self.gw_cache_ttl <= 3600:
+            errors.append("gw_cache_ttl must be between 0 and 3600 seconds")
+        errors += [
+            f"gw_cache_method_overrides: '{path}' is not one of "
+            f"{', '.join(self.method_paths)}"
+            for path in self.gw_cache_method_overrides
+            if path not in self.method_paths
+        ]
+        # The stage cache only covers GET methods unless a method override
+        # turns it on, otherwise the cluster is paid for and caches nothing
+        if self.gw_cache_enabled and self.gw_method.upper() != "GET" and \
+                not any(override.enabled for override in
+                        self.gw_cache_method_overrides.values()):
+            errors.append(
+                "gw_cache_enabled only caches GET methods, add an enabled "
+                "gw_cache_method_overrides entry for "
+                f"'{self.api_key_method_path}'")
+        errors += [
+            f"gw_cache_key_parameters: '{param}' is not a method request "
+            "path, querystring or header parameter"
+            for param in self.gw_cache_key_parameters
+            if not re.match(r"^method\.request\.(path|querystring|header)\.",
+                            param)
+        ]
+        errors += [
+            f"gw_request_parameters: '{param}' is not a method request "
+            "path, querystring or header parameter"
+            for param in self.gw_request_parameters
+            if not re.match(r"^method\.request\.(path|querystring|header)\.",
+                            param)
+        ]
+        errors += [
+            f"gw_request_parameters: path parameter '{param}' must be "
+            "required"
+            for param, required in self.gw_request_parameters.items()
+            if param.startswith("method.request.path.") and not required
+        ]
+        errors += [
+            f"gw_binary_media_types: '{media_type}' is not a media type"
+            for media_type in self.gw_binary_media_types
+            if not re.match(r"^[\w.+*-]+/[\w.+*-]+$", media_type)
+        ]
+        return errors
+
+    def throttle_errors(self) -> typing.List[str]:
+        errors = []
+        if self.gw_api_type == "HTTP" and (self.gw_usage_plans or
+                                           self.gw_method_throttles):
+            errors.append("gw_usage_plans and gw_method_throttles are only "
+                          "supported with gw_api_type rest")
+        errors += [
+            f"gw_method_throttles: '{path}' is not one of "
+            f"{', '.join(self.method_paths)}"
+            for path in self.gw_method_throttles
+            if path not in self.method_paths
+        ]
+
+        names = [tier.name for tier in self.gw_usage_plans]
+        errors += [
+            f"gw_usage_plans: '{name}' is used by more than one tier"
+            for name in sorted(set(names)) if names.count(name) > 1
+        ]
+        keys = [key for tier in self.gw_usage_plans for key in tier.api_keys]
+        errors += [
+            f"gw_usage_plans: api key '{key}' is in more than one tier"
+            for key in sorted(set(keys)) if keys.count(key) > 1
+        ]
+        # Usage plans only meter the methods that require an API key
+        errors += [
+            f"gw_usage_plans: {tier.name} throttles '{path}', which does "
+            "not require an API key"
+            for tier in self.gw_usage_plans for path in tier.method_throttles
+            if path != self.api_key_method_path
+        ]
+        return errors
+
+    @property
+    def api_key_method_path(self) -> str:
+        return f"/{self.gw_root_resource}/{self.gw_method}"
+
+    @property
+    def method_paths(self) -> typing.List[str]:
+        # Every method the construct creates, the CORS preflight included
+        return [self.api_key_method_path, f"/{self.gw_root_resource}/OPTIONS"]
+
+    def plan_limits(self) -> typing.Tuple[float, int]:
+        # Plan throttles apply per API key, so every key can use its tier's
+        # full rate at once. The stage throttle caps the total.
+        if self.gw_usage_plans:
+            rate = sum(tier.rate_limit * len(tier.api_keys)
+                       for tier in self.gw_usage_plans)
+            burst = sum(tier.burst_limit * len(tier.api_keys)
+                        for tier in self.gw_usage_plans)
+        else:
+            rate = self.gw_api_key_usage_throttle
+            burst = self.gw_api_key_usage_burst
+        stage = self.gw_method_throttles.get(self.api_key_method_path)
+        if stage:
+            rate = min(rate, stage.rate_limit)
+            burst = min(burst, stage.burst_limit)
+        return rate, burst
+
+    @property
+    def access_log_namespace(self) -> str:
+        return self.gw_access_log_namespace or "ApiAccessLogs/" + self.gw_name
+
+    @property
+    def access_log_resource_field(self) -> str:
+        return ACCESS_LOG_RESOURCE_FIELDS[self.gw_api_type]
+
+
+@slotted
+@dataclass(frozen=True)
+class EncryptionConfig(BaseConfig):
+    # kms_managed is what the constructs use without an encryption context
+    enc_profile: str = choice(ENCRYPTION_PROFILES, default="KMS_MANAGED")
+    enc_sqs_data_key_reuse: int = SQS_MAX_DATA_KEY_REUSE_SECONDS
+    enc_requests_per_second: float = 100.0
+
+    def validate(self) -> typing.List[str]:
+        errors = []
+        if not SQS_MIN_DATA_KEY_REUSE_SECONDS <= self.enc_sqs_data_key_reuse \
+                <= SQS_MAX_DATA_KEY_REUSE_SECONDS:
+            errors.append("enc_sqs_data_key_reuse must be between "
+                          f"{SQS_MIN_DATA_KEY_REUSE_SECONDS} and "
+                          f"{SQS_MAX_DATA_KEY_REUSE_SECONDS} seconds")
+        if self.enc_requests_per_second <= 0:
+            errors.append("enc_requests_per_second must be greater than 0")
+        return errors
+
+    # Settings per service, as CDK enum member names
+
+    @property
+    def bucket_encryption(self) -> str:
+        if self.enc_profile == "SERVICE_MANAGED":
+            return "S3_MANAGED"
+        return "KMS_MANAGED"
+
+    @property
+    def bucket_key_enabled(self) -> bool:
+        return self.enc_profile == "KMS_OPTIMIZED"
+
+    @property
+    def queue_encryption(self) -> str:
+        # SQS managed SSE is switched on with an override, the 1.95 L2
+        # queue has no member for it
+        if self.enc_profile == "SERVICE_MANAGED":
+            return "UNENCRYPTED"
+        return "KMS_MANAGED"
+
+    @property
+    def queue_data_key_reuse(self) -> typing.Optional[int]:
+        if self.enc_profile == "KMS_OPTIMIZED":
+            return self.enc_sqs_data_key_reuse
+        return None
+
+    @property
+    def table_encryption(self) -> str:
+        if self.enc_profile == "SERVICE_MANAGED":
+            return "DEFAULT"
+        return "AWS_MANAGED"
+
+
+@slotted
+@dataclass(frozen=True)
+class SloConfig(BaseConfig):
+    slo_service_name: str
+    slo_period: int = 60
+    slo_evaluation_periods: int = 5
+    slo_datapoints_to_alarm: int = 3
+    slo_api_p99_latency_ms: typing.Optional[float] = None
+    slo_lambda_p99_duration_ms: typing.Optional[float] = None
+    slo_lambda_error_perc: typing.Optional[float] = None
+    slo_request_anomaly_band: typing.Optional[float] = None
+    slo_ddb_throttle_events: typing.Optional[int] = None
+    slo_alarm_topic_arn: typing.Optional[str] = None
+
+    def validate(self) -> typing.List[str]:
+        errors = []
+        if self.slo_period not in (10, 30) and self.slo_period % 60:
+            errors.append("slo_period must be 10, 30 or a multiple of 60")
+        if not 1 <= self.slo_datapoints_to_alarm <= self.slo_evaluation_periods:
+            errors.append("slo_datapoints_to_alarm must be between 1 and "
+                          "slo_evaluation_periods")
+        for name in ("slo_api_p99_latency_ms", "slo_lambda_p99_duration_ms",
+                     "slo_lambda_error_perc", "slo_request_anomaly_band"):
+            if getattr(self, name) is not None and getattr(self, name) <= 0:
+                errors.append(f"{name} must be greater than 0")
+        if self.slo_ddb_throttle_events is not None and \
+                self.slo_ddb_throttle_events < 0:
+            errors.append("slo_ddb_throttle_events must not be negative")
+        return errors
+
+
+@slotted
+@dataclass(frozen=True)
+class FleetDashboardConfig(BaseConfig):
+    dash_name: str
+    dash_period: int = 300
+    dash_top_n: int = 10
+    dash_api_stage: typing.Optional[str] = None
+    dash_search_terms: typing.Dict[str, str] = field(default_factory=dict)
+
+    def validate(self) -> typing.List[str]:
+        errors = []
+        if self.dash_period not in (10, 30) and self.dash_period % 60:
+            errors.append("dash_period must be 10, 30 or a multiple of 60")
+        if not 1 <= self.dash_top_n <= METRIC_MATH_MAX_SERIES:
+            errors.append(f"dash_top_n must be between 1 and "
+                          f"{METRIC_MATH_MAX_SERIES}")
+        errors += [
+            f"dash_search_terms: '{service}' is not one of "
+            f"{', '.join(FLEET_SERVICES)}"
+            for service in self.dash_search_terms
+            if service not in FLEET_SERVICES
+        ]
+        return errors
+
+
+@slotted
+@dataclass(frozen=True)
+class SiteConfig(BaseConfig):
+    access_logs_bucket_name: str
+    static_site_bucket_name: str
+    website_index_document: str
+    cfront_allowed_methods: str = choice(ALLOWED_METHODS)
+    cfront_viewer_policy: str = choice(VIEWER_PROTOCOL_POLICIES)
+    cfront_price_class: str = choice(PRICE_CLASSES)
+    cfront_distribution_name: str = field()
+    cfront_origins_comment: str = field()
+    cfront_root_object: str = field()
+    cfront_dist_comment: str = field()
+    cfront_log_file_prefix: str = field()
+    geo_whitelist: str = field()
+    cfront_default_cache_policy: typing.Optional[CachePolicyConfig] = None
+    cfront_behaviors: typing.List[BehaviorConfig] = field(
+        default_factory=list)
+    site_build_dir: typing.Optional[str] = None
+    site_hashed_file_pattern: str = HASHED_FILE_PATTERN
+    site_cache_control_rules: typing.List[CacheControlRuleConfig] = field(
+        default_factory=list)
+    site_default_cache_control: str = DEFAULT_CACHE_CONTROL
+    site_deploy_memory: int = 1024
+    site_manifest_key: str = SITE_MANIFEST_KEY
+    site_max_invalidation_paths: int = 100
+    site_prune: bool = True
+    cfront_spa_routing: bool = False
+    cfront_security_headers: bool = False
+    cfront_response_headers: typing.Dict[str, str] = field(
+        default_factory=dict)
+
+    def validate(self) -> typing.List[str]:
+        errors = []
+        errors += [
+            f"cfront_response_headers: '{name}' is not a header name"
+            for name in self.cfront_response_headers
+            if not re.match(r"^[A-Za-z0-9-]+$", name)
+        ]
+        patterns = [b.path_pattern for b in self.cfront_behaviors]
+        errors += [
+            f"cfront_behaviors: duplicate path_pattern '{pattern}'"
+            for pattern in sorted(set(patterns)) if patterns.count(pattern) > 1
+        ]
+        try:
+            re.compile(self.site_hashed_file_pattern)
+        except re.error as err:
+            errors.append(f"site_hashed_file_pattern is not a valid regex: "
+                          f"{err}")
+        return errors
+
+    @property
+    def response_headers(self) -> typing.Dict[str, str]:
+        # CloudFront Functions see header names in lower case
+        headers = dict(SECURITY_HEADERS) if self.cfront_security_headers \
+            else {}
+        headers.update({
+            name.lower(): value
+            for name, value in self.cfront_response_headers.items()
+        })
+        return headers
+
+
+###
+# Parsing
+###
+
+_CACHE = weakref.WeakKeyDictionary()
+
+
+def load_config(scope, config_cls, context_key: str):
+    # Parsed once per app and context key, constructs share the instance
+    root = scope.node.root
+    try:
+        app_cache = _CACHE.setdefault(root, {})
+    except TypeError:
+        app_cache = {}
+
+    cache_key = (config_cls, context_key)
+    if cache_key not in app_cache:
+        raw = scope.node.try_get_context(context_key)
+        app_cache[cache_key] = parse_config(config_cls, raw, context_key)
+    return app_cache[cache_key]
+
+
+def validate_context(scope, schemas: typing.Dict[str, type]) -> None:
+    # Loads every context key up front and reports all errors together
+    errors = []
+    for context_key, config_cls in schemas.items():
+        try:
+            load_config(scope, config_cls, context_key)
+        except ConfigError as err:
+            errors += [f"{context_key}: {error}" for error in err.errors]
+    if errors:
+        raise ConfigError(", ".join(schemas), errors)
+
+
+def parse_config(config_cls, raw, context_key: str):
+    errors = []
+    if raw is None:
+        raise ConfigError(context_key, ["context key is not set"])
+    config = _parse_value(raw, config_cls, "", errors)
+    if errors:
+        raise ConfigError(context_key, errors)
+    return config
+
+
+def _parse_dataclass(raw, config_cls, path: str, errors: typing.List[str]):
+    if not isinstance(raw, dict):
+        errors.append(f"{path or config_cls.__name__}: expected an object, "
+                      f"got {type(raw).__name__}")
+        return None
+
+    hints = typing.get_type_hints(config_cls)
+    known = [f.name for f in fields(config_cls)]
+    for key in raw:
+        if key not in known:
+            close = difflib.get_close_matches(key, known, n=1)
+            hint = f" (did you mean '{close[0]}'?)" if close else ""
+            errors.append(f"{path}{key}: unknown key{hint}")
+
+    # Field level errors leave values unset, so the block is not built and
+    # cross-field validation does not run on partial data
+    errors_before = len(errors)
+    values = {}
+    for f in fields(config_cls):
+        if f.name not in raw:
+            if f.default is MISSING and f.default_factory is MISSING:
+                errors.append(f"{path}{f.name}: required key is missing")
+            continue
+
+        value = _parse_value(raw[f.name], hints[f.name], f"{path}{f.name}",
+                             errors)
+        choices = f.metadata.get("choices")
+        if choices is not None and value is not None:
+            if value in choices:
+                value = choices[value]
+            else:
+                errors.append(f"{path}{f.name}: '{value}' is not one of "
+                              f"{', '.join(choices)}")
+        values[f.name] = value
+
+    if len(errors) > errors_before:
+        return None
+
+    config = config_cls(**values)
+    errors += [f"{path}{error}" for error in config.validate()]
+    return config
+
+
+def _parse_value(value, tp, path: str, errors: typing.List[str]):
+    origin = typing.get_origin(tp)
+    args = typing.get_args(tp)
+
+    if origin is typing.Union:
+        if value is None and type(None) in args:
+            return None
+        inner = [arg for arg in args if arg is not type(None)][0]
+        return _parse_value(value, inner, path, errors)
+
+    if origin is list:
+        if not isinstance(value, list):
+            errors.append(f"{path}: expected a list, got "
+                          f"{type(value).__name__}")
+            return None
+        return [
+            _parse_value(item, args[0], f"{path}[{idx}]", errors)
+            for idx, item in enumerate(value)
+        ]
+
+    if origin is dict:
+        if not isinstance(value, dict):
+            errors.append(f"{path}: expected an object, got "
+                          f"{type(value).__name__}")
+            return None
+        return {
+            key: _parse_value(item, args[1], f"{path}.{key}", errors)
+            for key, item in value.items()
+        }
+
+    if is_dataclass(tp):
+        return _parse_dataclass(value, tp, f"{path}." if path else "", errors)
+
+    if tp is float:
+        valid = isinstance(value, (int, float)) and not isinstance(value, bool)
+    elif tp is int:
+        valid = isinstance(value, int) and not isinstance(value, bool)
+    else:
+        valid = isinstance(value, tp)
+
+    if not valid:
+        errors.append(f"{path}: expected {tp.__name__}, got "
+                      f"{type(value).__name__}")
+        return None
+    return value
@@ -1,112 +1,462 @@
-from aws_cdk import (core, aws_iam as _iam, aws_dynamodb as _ddb,
-                     aws_cloudwatch as _cwlogs, aws_logs as _logs, aws_sqs as
-                     _sqs, aws_lambda as _lambda)
+import typing
+
+from aws_cdk import (core, aws_iam as _iam, aws_dynamodb as _ddb)
 
 from aws_cdk.aws_dynamodb import (BillingMode, Table, Attribute, AttributeType,
                                   ITable, ProjectionType)
 
+from .capacity_planner import monthly_costs
+from .construct_config import (ConfigError, DbConfig, EncryptionConfig,
+                               GlobalIndexConfig, load_config)
+from .kms_call_estimator import kms_report
+
+# aws_dax and aws_ec2 are only loaded when DAX is enabled, aws_lambda and
+# aws_sqs when a stream consumer is attached
+if typing.TYPE_CHECKING:
+    from aws_cdk import (aws_dax as _dax, aws_lambda as _lambda,
+                         aws_sqs as _sqs)
+
+# Constants
+DAX_PORT = 8111
+# Item and query actions only, the cluster admin actions are left out
+DAX_DATA_ACTIONS = [
+    "dax:GetItem",
+    "dax:BatchGetItem",
+    "dax:Query",
+    "dax:Scan",
+    "dax:PutItem",
+    "dax:UpdateItem",
+    "dax:DeleteItem",
+    "dax:BatchWriteItem",
+    "dax:ConditionCheckItem",
+]
+
 
 class DbConstruct(core.Construct):
-    def __init__(self, scope: core.Construct, construct_id: str,
-                 db_context: str, **kwargs) -> None:
+    def __init__(self,
+                 scope: core.Construct,
+                 construct_id: str,
+                 db_context: str,
+                 stream_consumer_fn: "_lambda.IFunction" = None,
+                 encryption_context: str = None,
+                 **kwargs) -> None:
         super().__init__(scope, construct_id, **kwargs)
 
         # setting the db context
-        db = dict(self.node.try_get_context(db_context))
+        db = load_config(self, DbConfig, db_context)
+        enc = load_config(self, EncryptionConfig, encryption_context) \
+            if encryption_context else EncryptionConfig()
+        if encryption_context:
+            core.Annotations.of(self).add_info(kms_report("dynamodb", enc))
+        table_encryption = getattr(_ddb.TableEncryption, enc.table_encryption)
+        # Replicas turn the stream on with both images
+        if stream_consumer_fn and not db.db_stream_view_type and \
+                not db.db_replica_regions:
+            raise ConfigError(db_context, [
+                "db_stream_view_type is required with a stream consumer"
+            ])
+        stream_view_type = getattr(_ddb.StreamViewType,
+                                   db.db_stream_view_type) \
+            if db.db_stream_view_type else None
 
         # Shortening some of the logic
-        billing_mode = BillingMode.PROVISIONED if db[
-            "db_billing_mode"] == "provisioned" else BillingMode.PAY_PER_REQUEST
-        pk = db["db_table_pk"]
-        pk_type = AttributeType.STRING if db[
-            "db_table_pk_type"] == "string" else AttributeType.NUMBER
-        sk = None if db["db_table_sk"] == "" else db["db_table_sk"]
-        sk_type = AttributeType.STRING if db[
-            "db_table_sk_type"] == "string" else AttributeType.NUMBER
-        gsi_projection_type = ProjectionType.ALL if db[
-            "db_gsi_projection"] == "all" else ProjectionType.KEYS_ONLY
-        lsi_projection_type = ProjectionType.ALL if db[
-            "db_lsi_projection"] == "all" else ProjectionType.KEYS_ONLY
+        billing_mode = getattr(BillingMode, db.db_billing_mode)
+        # Capacities are only set on provisioned tables, on demand tables
+        # still get the plan reported
+        provisioned = billing_mode == BillingMode.PROVISIONED
+        pk = db.db_table_pk
+        pk_type = getattr(AttributeType, db.db_table_pk_type)
+        sk = db.sort_key
+        sk_type = getattr(AttributeType, db.db_table_sk_type)
+        gsi_projection_type = getattr(ProjectionType, db.db_gsi_projection)
+        lsi_projection_type = getattr(ProjectionType, db.db_lsi_projection)
 
         if sk:
             table = Table(
                 self,
-                db["db_table"],
-                table_name=db["db_table"],
+                db.db_table,
+                table_name=db.db_table,
                 partition_key=Attribute(name=pk, type=pk_type),
                 sort_key=Attribute(name=sk, type=sk_type),
-                read_capacity=db["db_min_read_capacity"],
-                write_capacity=db["db_min_write_capacity"],
-                encryption=_ddb.TableEncryption.AWS_MANAGED,
+                read_capacity=db.table_capacity("min", "read")
+                if provisioned else None,
+                write_capacity=db.table_capacity("min", "write")
+                if provisioned else None,
+                encryption=table_encryption,
                 point_in_time_recovery=True,
                 removal_policy=core.RemovalPolicy.DESTROY,
                 billing_mode=billing_mode,
+                stream=stream_view_type,
+                time_to_live_attribute=db.db_ttl_attribute,
+                replication_regions=db.db_replica_regions or None,
             )
         else:
             table = Table(
                 self,
-                db["db_table"],
-                table_name=db["db_table"],
+                db.db_table,
+                table_name=db.db_table,
                 partition_key=Attribute(name=pk, type=pk_type),
-                read_capacity=db["db_min_read_capacity"],
-                write_capacity=db["db_min_write_capacity"],
-                encryption=_ddb.TableEncryption.AWS_MANAGED,
+                read_capacity=db.table_capacity("min", "read")
+                if provisioned else None,
+                write_capacity=db.table_capacity("min", "write")
+                if provisioned else None,
+                encryption=table_encryption,
                 point_in_time_recovery=True,
                 removal_policy=core.RemovalPolicy.DESTROY,
                 billing_mode=billing_mode,
+                stream=stream_view_type,
+                time_to_live_attribute=db.db_ttl_attribute,
+                replication_regions=db.db_replica_regions or None,
             )
 
         # Add read/write autoscaling enabled at X% utilization
-        if db["db_billing_mode"] == "provisioned" and db[
-                "db_enable_autoscaling"]:
+        if provisioned and db.db_enable_autoscaling:
             read_scaling = table.auto_scale_read_capacity(
-                min_capacity=db["db_min_read_capacity"],
-                max_capacity=db["db_max_read_capacity"],
+                min_capacity=db.table_capacity("min", "read"),
+                max_capacity=db.table_capacity("max", "read"),
             )
 
             read_scaling.scale_on_utilization(
-                target_utilization_percent=db["db_target_utilization"], )
+                target_utilization_percent=db.db_target_utilization, )
             write_scaling = table.auto_scale_write_capacity(
-                min_capacity=db["db_min_write_capacity"],
-                max_capacity=db["db_max_write_capacity"],
+                min_capacity=db.table_capacity("min", "write"),
+                max_capacity=db.table_capacity("max", "write"),
             )
             write_scaling.scale_on_utilization(
-                target_utilization_percent=db["db_target_utilization"], )
+                target_utilization_percent=db.db_target_utilization, )
 
         # setting projection with keys or all
 
-        if db["db_reverse_index"] and sk:
+        if db.db_reverse_index and sk:
             table.add_global_secondary_index(
                 partition_key=Attribute(name=sk, type=sk_type),
                 sort_key=_ddb.Attribute(name=pk, type=pk_type),
-                read_capacity=db["db_min_read_capacity"],
-                write_capacity=db["db_min_write_capacity"],
+                read_capacity=db.reverse_index_capacity("min", "read")
+                if provisioned else None,
+                write_capacity=db.reverse_index_capacity("min", "write")
+                if provisioned else None,
                 index_name='reverseIndex',
                 projection_type=gsi_projection_type,
             )
-            table.auto_scale_global_secondary_index_read_capacity(
-                index_name='reverseIndex',
-                min_capacity=db["db_min_read_capacity"],
-                max_capacity=db["db_max_read_capacity"],
-            )
-            table.auto_scale_global_secondary_index_write_capacity(
-                index_name='reverseIndex',
-                min_capacity=db["db_min_write_capacity"],
-                max_capacity=db["db_max_write_capacity"],
-            )
+            # Autoscaling only applies to provisioned indexes, the write
+            # policy is also required on provisioned global tables
+            if provisioned and db.db_enable_autoscaling:
+                reverse_read_scaling = \
+                    table.auto_scale_global_secondary_index_read_capacity(
+                        index_name='reverseIndex',
+                        min_capacity=db.reverse_index_capacity("min", "read"),
+                        max_capacity=db.reverse_index_capacity("max", "read"),
+                    )
+                reverse_read_scaling.scale_on_utilization(
+                    target_utilization_percent=db.db_target_utilization)
+                reverse_write_scaling = \
+                    table.auto_scale_global_secondary_index_write_capacity(
+                        index_name='reverseIndex',
+                        min_capacity=db.reverse_index_capacity("min", "write"),
+                        max_capacity=db.reverse_index_capacity("max", "write"),
+                    )
+                reverse_write_scaling.scale_on_utilization(
+                    target_utilization_percent=db.db_target_utilization)
         else:
             print("No Reverse indexes created")
 
         # Add LSI with a projection of All
-        if db["db_add_lsi"]:
+        if db.db_add_lsi:
             table.add_local_secondary_index(
                 index_name='LSI1',
                 projection_type=lsi_projection_type,
                 sort_key=Attribute(name='LSISK', type=AttributeType.STRING),
             )
 
+        # Declared indexes, a GSI keyed on an attribute only some items
+        # carry stays sparse and is only billed for those items
+        for index in db.db_global_indexes:
+            self.add_global_index(db, table, index, billing_mode)
+
+        # Local indexes can only be created along with the table
+        for index in db.db_local_indexes:
+            table.add_local_secondary_index(
+                index_name=index.name,
+                sort_key=Attribute(name=index.sort_key,
+                                   type=getattr(AttributeType,
+                                                index.sort_key_type)),
+                projection_type=getattr(ProjectionType, index.projection),
+                non_key_attributes=index.non_key_attributes or None,
+            )
+
+        # Provisioned replicas copy the write scaling of the table and its
+        # indexes, so they are created once every policy is in place. CDK
+        # only orders them after the table's own write scaling.
+        if db.db_replica_regions and billing_mode == BillingMode.PROVISIONED:
+            write_scaling = [
+                child for child in table.node.children
+                if child.node.id.endswith("WriteScaling")
+            ]
+            for region in db.db_replica_regions:
+                table.node.find_child("Replica" + region).node.add_dependency(
+                    *write_scaling)
+
+        # Capacity planned from the declared traffic, reported at synth
+        if db.db_traffic or db.db_reverse_index_traffic or any(
+                index.traffic for index in db.db_global_indexes):
+            self.report_capacity_plan(db, billing_mode)
+
         self.table = table
+        self.dax_cluster = None
+        self.stream_mapping = None
+        self.stream_failure_queue = None
+
+        # Derived views are kept up to date from the stream instead of
+        # rebuilt with table scans
+        if stream_consumer_fn:
+            self.stream_mapping = self.add_stream_consumer(
+                db, table, stream_consumer_fn, enc)
+
+        # DAX read-through cache in front of the table
+        if db.db_dax_enabled:
+            self.dax_cluster = self.add_dax_cluster(db, table)
+
+    def add_global_index(self, db: DbConfig, table: Table,
+                         index: GlobalIndexConfig,
+                         billing_mode: BillingMode) -> None:
+        provisioned = billing_mode == BillingMode.PROVISIONED
+        table.add_global_secondary_index(
+            index_name=index.name,
+            partition_key=Attribute(name=index.partition_key,
+                                    type=getattr(AttributeType,
+                                                 index.partition_key_type)),
+            sort_key=Attribute(name=index.sort_key,
+                               type=getattr(AttributeType,
+                                            index.sort_key_type))
+            if index.sort_key else None,
+            projection_type=getattr(ProjectionType, index.projection),
+            non_key_attributes=index.non_key_attributes or None,
+            read_capacity=db.index_capacity(index, "min", "read")
+            if provisioned else None,
+            write_capacity=db.index_capacity(index, "min", "write")
+            if provisioned else None,
+        )
+
+        if not provisioned or not db.db_enable_autoscaling:
+            return
+
+        # Each index scales on its own bounds, defaulting to the table ones
+        target_utilization = index.target_utilization or \
+            db.db_target_utilization
+        read_scaling = table.auto_scale_global_secondary_index_read_capacity(
+            index_name=index.name,
+            min_capacity=db.index_capacity(index, "min", "read"),
+            max_capacity=db.index_capacity(index, "max", "read"),
+        )
+        read_scaling.scale_on_utilization(
+            target_utilization_percent=target_utilization)
+        write_scaling = \
+            table.auto_scale_global_secondary_index_write_capacity(
+                index_name=index.name,
+                min_capacity=db.index_capacity(index, "min", "write"),
+                max_capacity=db.index_capacity(index, "max", "write"),
+            )
+        write_scaling.scale_on_utilization(
+            target_utilization_percent=target_utilization)
+
+    def report_capacity_plan(self, db: DbConfig,
+                             billing_mode: BillingMode) -> None:
+        plans = [(db.db_table, db.db_traffic, db.table_capacity)]
+        if db.db_reverse_index and db.sort_key:
+            plans.append(("reverseIndex", db.db_reverse_index_traffic or
+                          db.db_traffic, db.reverse_index_capacity))
+        plans += [(index.name, index.traffic or db.db_traffic,
+                   lambda limit, bound, index=index: db.index_capacity(
+                       index, limit, bound))
+                  for index in db.db_global_indexes]
+
+        lines = []
+        provisioned_cost = on_demand_cost = 0
+        for name, traffic, capacity in plans:
+            if capacity("max", "read") is None:
+                continue
+            lines.append(f"{name}: reads {capacity('min', 'read')}-"
+                         f"{capacity('max', 'read')} RCU, writes "
+                         f"{capacity('min', 'write')}-"
+                         f"{capacity('max', 'write')} WCU")
+            if traffic:
+                provisioned, on_demand = monthly_costs(
+                    traffic, capacity("max", "read"),
+                    capacity("max", "write"))
+                provisioned_cost += provisioned
+                on_demand_cost += on_demand
+
+        lines.append(f"estimated ${provisioned_cost:.2f}/month provisioned at "
+                     f"peak, ${on_demand_cost:.2f}/month on demand")
+        annotations = core.Annotations.of(self)
+        annotations.add_info("Capacity plan, " + "; ".join(lines))
+
+        if billing_mode == BillingMode.PROVISIONED and \
+                on_demand_cost < provisioned_cost:
+            annotations.add_warning(
+                "On demand billing is estimated cheaper for the declared "
+                "traffic, consider db_billing_mode on_demand")
+        elif billing_mode == BillingMode.PAY_PER_REQUEST and \
+                provisioned_cost < on_demand_cost:
+            annotations.add_info(
+                "Provisioned billing is estimated cheaper for the declared "
+                "traffic, consider db_billing_mode provisioned")
+
+    def add_stream_consumer(
+            self, db: DbConfig, table: Table, consumer_fn: "_lambda.IFunction",
+            enc: EncryptionConfig) -> "_lambda.EventSourceMapping":
+        from aws_cdk import aws_lambda as _lambda, aws_sqs as _sqs
+        from aws_cdk.aws_lambda_event_sources import SqsDlq
+
+        # Records that exhaust their retries are sent here as metadata
+        on_failure = None
+        if db.db_stream_on_failure_queue_name:
+            self.stream_failure_queue = _sqs.Queue(
+                self,
+                db.db_stream_on_failure_queue_name,
+                queue_name=db.db_stream_on_failure_queue_name,
+                encryption=getattr(_sqs.QueueEncryption,
+                                   enc.queue_encryption),
+                data_key_reuse=core.Duration.seconds(enc.queue_data_key_reuse)
+                if enc.queue_data_key_reuse else None,
+                retention_period=core.Duration.days(14),
+            )
+            # SQS managed SSE has no member on the 1.95 L2 queue
+            if enc.queue_encryption == "UNENCRYPTED":
+                self.stream_failure_queue.node.default_child \
+                    .add_property_override("SqsManagedSseEnabled", True)
+            on_failure = SqsDlq(self.stream_failure_queue)
+
+        batching_window = db.db_stream_max_batching_window
+        stream_mapping = _lambda.EventSourceMapping(
+            self,
+            db.db_table + "StreamConsumer",
+            target=consumer_fn,
+            event_source_arn=table.table_stream_arn,
+            starting_position=getattr(_lambda.StartingPosition,
+                                      db.db_stream_starting_position),
+            batch_size=db.db_stream_batch_size,
+            max_batching_window=core.Duration.seconds(batching_window)
+            if batching_window else None,
+            # Batches per shard processed concurrently, records with the
+            # same partition key stay in order
+            parallelization_factor=db.db_stream_parallelization_factor,
+            bisect_batch_on_error=db.db_stream_bisect_on_error or None,
+            retry_attempts=db.db_stream_retry_attempts,
+            max_record_age=core.Duration.seconds(db.db_stream_max_record_age)
+            if db.db_stream_max_record_age else None,
+            on_failure=on_failure,
+        )
+        cfn_mapping = stream_mapping.node.default_child
+
+        # Tumbling windows carry an aggregate state between invocations,
+        # they are not on the 1.95 L2 mapping yet
+        if db.db_stream_tumbling_window is not None:
+            cfn_mapping.add_property_override("TumblingWindowInSeconds",
+                                              db.db_stream_tumbling_window)
+
+        if db.db_stream_report_batch_item_failures:
+            cfn_mapping.add_property_override("FunctionResponseTypes",
+                                              ["ReportBatchItemFailures"])
+
+        table.grant_stream_read(consumer_fn)
+
+        return stream_mapping
+
+    def add_dax_cluster(self, db: DbConfig,
+                        table: Table) -> "_dax.CfnCluster":
+        from aws_cdk import aws_dax as _dax, aws_ec2 as _ec2
+
+        dax_name = db.db_dax_cluster_name
+
+        dax_role = _iam.Role(
+            self,
+            dax_name + "Role",
+            assumed_by=_iam.ServicePrincipal("dax.amazonaws.com"),
+        )
+        table.grant_read_write_data(dax_role)
+
+        dax_subnet_group = _dax.CfnSubnetGroup(
+            self,
+            dax_name + "SubnetGroup",
+            subnet_group_name=dax_name + "-subnets",
+            subnet_ids=db.db_dax_subnet_ids,
+        )
+
+        # TTLs are set in milliseconds on the parameter group
+        dax_parameter_group = _dax.CfnParameterGroup(
+            self,
+            dax_name + "ParameterGroup",
+            parameter_group_name=dax_name + "-params",
+            parameter_name_values={
+                "record-ttl-millis": str(db.db_dax_item_ttl_ms),
+                "query-ttl-millis": str(db.db_dax_query_ttl_ms),
+            },
+        )
+
+        # Use the given security groups, or open the DAX port to the clients
+        security_group_ids = db.db_dax_security_group_ids
+        if not security_group_ids:
+            dax_security_group = _ec2.CfnSecurityGroup(
+                self,
+                dax_name + "SecurityGroup",
+                group_description=f"DAX cluster {dax_name}",
+                vpc_id=db.db_dax_vpc_id,
+                security_group_ingress=[{
+                    "ipProtocol": "tcp",
+                    "fromPort": DAX_PORT,
+                    "toPort": DAX_PORT,
+                    "cidrIp": db.db_dax_ingress_cidr,
+                }],
+            )
+            security_group_ids = [dax_security_group.attr_group_id]
+
+        dax_cluster = _dax.CfnCluster(
+            self,
+            dax_name,
+            cluster_name=dax_name,
+            iam_role_arn=dax_role.role_arn,
+            node_type=db.db_dax_node_type,
+            replication_factor=db.db_dax_node_count,
+            subnet_group_name=dax_subnet_group.ref,
+            parameter_group_name=dax_parameter_group.ref,
+            security_group_ids=security_group_ids,
+            sse_specification={"sseEnabled": True},
+        )
+
+        core.CfnOutput(self,
+                       "DaxEndpoint",
+                       value=(dax_cluster.attr_cluster_discovery_endpoint))
+
+        return dax_cluster
+
+    def grant_dax_access(self, grantee: _iam.IGrantable) -> _iam.Grant:
+        if not self.dax_cluster:
+            raise ValueError("grant_dax_access needs a DAX cluster, set "
+                             "db_dax_enabled in the db context")
+        return _iam.Grant.add_to_principal(
+            grantee=grantee,
+            actions=DAX_DATA_ACTIONS,
+            resource_arns=[self.dax_cluster.attr_arn],
+        )
 
     @property
     def main_table(self) -> ITable:
         return self.table
+
+    @property
+    def main_stream_mapping(self) -> "_lambda.IEventSourceMapping":
+        return self.stream_mapping
+
+    @property
+    def main_stream_failure_queue(self) -> "_sqs.IQueue":
+        return self.stream_failure_queue
+
+    @property
+    def main_dax_cluster_name(self) -> str:
+        return self.dax_cluster.cluster_name if self.dax_cluster else None
+
+    @property
+    def main_dax_endpoint(self) -> str:
+        return self.dax_cluster.attr_cluster_discovery_endpoint \
+            if self.dax_cluster else None
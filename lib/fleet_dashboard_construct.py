@@ -0,0 +1,222 @@
+import typing
+
+from aws_cdk import (aws_cloudwatch as cloud_watch, core)
+
+# Only needed for type hints, the resources are passed in
+if typing.TYPE_CHECKING:
+    from aws_cdk import (aws_lambda as _lambda, aws_apigateway as _api_gw,
+                         aws_dynamodb as _ddb, aws_sqs as _sqs)
+
+from .construct_config import (FleetDashboardConfig, SEARCH_QUERY_MAX_LENGTH,
+                               load_config)
+
+# Longest name each service allows, used to size name filters that are
+# still unresolved tokens at synth
+MAX_NAME_LENGTHS = {
+    "api": 128,
+    "lambda": 64,
+    "dynamodb": 255,
+    "sqs": 80,
+}
+
+
+class FleetDashboardConstruct(core.Construct):
+    def __init__(self,
+                 scope: core.Construct,
+                 id: str,
+                 dashboard_context: str,
+                 apis: typing.Sequence["_api_gw.RestApi"] = (),
+                 functions: typing.Sequence["_lambda.IFunction"] = (),
+                 tables: typing.Sequence["_ddb.ITable"] = (),
+                 queues: typing.Sequence["_sqs.IQueue"] = (),
+                 **kwargs) -> None:
+        super().__init__(scope, id, **kwargs)
+
+        self.dash = load_config(self, FleetDashboardConfig, dashboard_context)
+        self.names = {
+            "api": [api.rest_api_name for api in apis],
+            "lambda": [fn.function_name for fn in functions],
+            "dynamodb": [table.table_name for table in tables],
+            "sqs": [queue.queue_name for queue in queues],
+        }
+        self.unfiltered = set()
+
+        # Every widget is one SEARCH per metric, sorted and cut to the top N,
+        # so widget and metric counts stay the same however large the fleet
+        self.dashboard = cloud_watch.Dashboard(
+            self, id="FleetDashboard", dashboard_name=self.dash.dash_name)
+
+        if self.covers("api"):
+            api_dims = "{AWS/ApiGateway,ApiName,Stage}"
+            api_label = "${PROP('Dim.ApiName')} ${PROP('Dim.Stage')}"
+            self.dashboard.add_widgets(
+                self.graph("API GW Requests", [
+                    self.total("api", api_dims, "ApiName", "Count", "Sum"),
+                    self.top_n("api", api_dims, "ApiName", "Count", "Sum",
+                               api_label),
+                ]),
+                self.graph("API GW Latency p99", [
+                    self.top_n("api", api_dims, "ApiName", "Latency", "p99",
+                               api_label)
+                ]),
+                self.graph("API GW 5XX Errors", [
+                    self.top_n("api", api_dims, "ApiName", "5XXError", "Sum",
+                               api_label)
+                ]),
+            )
+
+        if self.covers("lambda"):
+            fn_dims = "{AWS/Lambda,FunctionName}"
+            fn_label = "${PROP('Dim.FunctionName')}"
+            self.dashboard.add_widgets(
+                self.graph("Lambda Invocations", [
+                    self.total("lambda", fn_dims, "FunctionName",
+                               "Invocations", "Sum"),
+                    self.top_n("lambda", fn_dims, "FunctionName",
+                               "Invocations", "Sum", fn_label),
+                ]),
+                self.graph("Lambda Errors", [
+                    self.top_n("lambda", fn_dims, "FunctionName", "Errors",
+                               "Sum", fn_label)
+                ]),
+                self.graph("Lambda Duration p99", [
+                    self.top_n("lambda", fn_dims, "FunctionName", "Duration",
+                               "p99", fn_label)
+                ]),
+                self.graph("Lambda Throttles", [
+                    self.top_n("lambda", fn_dims, "FunctionName", "Throttles",
+                               "Sum", fn_label)
+                ]),
+                self.graph("Lambda Concurrent Executions", [
+                    self.top_n("lambda", fn_dims, "FunctionName",
+                               "ConcurrentExecutions", "Maximum", fn_label)
+                ]),
+            )
+
+        if self.covers("dynamodb"):
+            table_dims = "{AWS/DynamoDB,TableName}"
+            table_label = "${PROP('Dim.TableName')}"
+            # One search covers every operation, instead of one metric per
+            # table and operation
+            self.dashboard.add_widgets(
+                self.graph("DynamoDB Latency p99", [
+                    self.top_n("dynamodb", "{AWS/DynamoDB,TableName,Operation}",
+                               "TableName", "SuccessfulRequestLatency", "p99",
+                               table_label + " ${PROP('Dim.Operation')}")
+                ]),
+                self.graph("DynamoDB Consumed Read Units", [
+                    self.top_n("dynamodb", table_dims, "TableName",
+                               "ConsumedReadCapacityUnits", "Sum", table_label)
+                ]),
+                self.graph("DynamoDB Consumed Write Units", [
+                    self.top_n("dynamodb", table_dims, "TableName",
+                               "ConsumedWriteCapacityUnits", "Sum",
+                               table_label)
+                ]),
+                self.graph("DynamoDB Throttles", [
+                    self.top_n("dynamodb", table_dims, "TableName",
+                               ("ReadThrottleEvents", "WriteThrottleEvents"),
+                               "Sum",
+                               table_label + " ${PROP('MetricName')}")
+                ]),
+            )
+
+        if self.covers("sqs"):
+            queue_dims = "{AWS/SQS,QueueName}"
+            queue_label = "${PROP('Dim.QueueName')}"
+            self.dashboard.add_widgets(
+                self.graph("SQS Messages Sent", [
+                    self.total("sqs", queue_dims, "QueueName",
+                               "NumberOfMessagesSent", "Sum"),
+                    self.top_n("sqs", queue_dims, "QueueName",
+                               "NumberOfMessagesSent", "Sum", queue_label),
+                ]),
+                self.graph("SQS Messages Visible", [
+                    self.top_n("sqs", queue_dims, "QueueName",
+                               "ApproximateNumberOfMessagesVisible", "Maximum",
+                               queue_label)
+                ]),
+                self.graph("SQS Age of Oldest Message", [
+                    self.top_n("sqs", queue_dims, "QueueName",
+                               "ApproximateAgeOfOldestMessage", "Maximum",
+                               queue_label)
+                ]),
+            )
+
+        for service in sorted(self.unfiltered):
+            core.Annotations.of(self).add_warning(
+                f"Too many {service} names to filter a SEARCH query, the "
+                f"{service} widgets show the top {self.dash.dash_top_n} of "
+                f"the whole account. Set dash_search_terms.{service} to "
+                "narrow them.")
+
+    def covers(self, service: str) -> bool:
+        return bool(self.names[service]) or \
+            service in self.dash.dash_search_terms
+
+    def graph(
+            self, title: str,
+            metrics: typing.List[cloud_watch.IMetric]
+    ) -> cloud_watch.GraphWidget:
+        return cloud_watch.GraphWidget(title=title, width=8, left=metrics)
+
+    def top_n(self, service: str, dims: str, name_dim: str,
+              metric_name: typing.Union[str, typing.Tuple[str, ...]],
+              stat: str, label: str) -> cloud_watch.MathExpression:
+        search = self.search(service, dims, name_dim, metric_name, stat)
+        return self.expression(
+            f"SORT({search}, MAX, DESC, {self.dash.dash_top_n})", label)
+
+    def total(self, service: str, dims: str, name_dim: str, metric_name: str,
+              stat: str) -> cloud_watch.MathExpression:
+        search = self.search(service, dims, name_dim, metric_name, stat)
+        return self.expression(f"SUM({search})", "Total")
+
+    def expression(self, expression: str,
+                   label: str) -> cloud_watch.MathExpression:
+        return cloud_watch.MathExpression(
+            expression=expression,
+            label=label,
+            using_metrics={},
+            period=core.Duration.seconds(self.dash.dash_period))
+
+    def search(self, service: str, dims: str, name_dim: str,
+               metric_name: typing.Union[str, typing.Tuple[str, ...]],
+               stat: str) -> str:
+        if isinstance(metric_name, str):
+            query = f'{dims} MetricName="{metric_name}"'
+        else:
+            query = dims + " (" + " OR ".join(
+                f'MetricName="{name}"' for name in metric_name) + ")"
+
+        if service == "api" and self.dash.dash_api_stage:
+            query += f' Stage="{self.dash.dash_api_stage}"'
+
+        term = self.dash.dash_search_terms.get(service)
+        if term:
+            query += f" {term}"
+        else:
+            query += self.name_filter(service, name_dim, len(query))
+
+        return f"SEARCH('{query}', '{stat}', {self.dash.dash_period})"
+
+    def name_filter(self, service: str, name_dim: str,
+                    query_length: int) -> str:
+        names = self.names[service]
+        if not names:
+            return ""
+
+        # Tokens resolve at deploy, so size them at the service's limit
+        clause = " (" + " OR ".join(f'{name_dim}="{name}"'
+                                    for name in names) + ")"
+        length = query_length + len(clause) + sum(
+            MAX_NAME_LENGTHS[service] - len(name) for name in names
+            if core.Token.is_unresolved(name))
+        if length > SEARCH_QUERY_MAX_LENGTH:
+            self.unfiltered.add(service)
+            return ""
+        return clause
+
+    @property
+    def main_dashboard(self) -> cloud_watch.Dashboard:
+        return self.dashboard
@@ -0,0 +1,52 @@
+import dataclasses
+import math
+
+from .construct_config import (ENCRYPTION_PROFILES, EncryptionConfig,
+                               SQS_DEFAULT_DATA_KEY_REUSE_SECONDS)
+
+REQUESTS = 1000000
+# S3 documents up to 99% fewer KMS requests with bucket keys
+S3_BUCKET_KEY_REDUCTION = 0.99
+# One data key per producer and per consumer for each reuse period
+SQS_PRINCIPALS = 2
+# DynamoDB caches the table key for 5 minutes per caller
+DYNAMODB_TABLE_KEY_CACHE_SECONDS = 300
+
+
+def kms_calls_per_million(service: str, enc: EncryptionConfig) -> int:
+    # Time the million requests take at the expected rate
+    window = REQUESTS / enc.enc_requests_per_second
+
+    if service == "s3":
+        if enc.bucket_encryption != "KMS_MANAGED":
+            return 0
+        if enc.bucket_key_enabled:
+            return round(REQUESTS * (1 - S3_BUCKET_KEY_REDUCTION))
+        return REQUESTS
+
+    if service == "sqs":
+        if enc.queue_encryption != "KMS_MANAGED":
+            return 0
+        reuse = enc.queue_data_key_reuse or SQS_DEFAULT_DATA_KEY_REUSE_SECONDS
+        return min(REQUESTS, SQS_PRINCIPALS * math.ceil(window / reuse))
+
+    if service == "dynamodb":
+        if enc.table_encryption != "AWS_MANAGED":
+            return 0
+        return min(REQUESTS,
+                   math.ceil(window / DYNAMODB_TABLE_KEY_CACHE_SECONDS))
+
+    raise ValueError(f"unknown service '{service}'")
+
+
+def kms_report(service: str, enc: EncryptionConfig) -> str:
+    estimates = []
+    for name, profile in ENCRYPTION_PROFILES.items():
+        calls = kms_calls_per_million(
+            service, dataclasses.replace(enc, enc_profile=profile))
+        estimates.append(f"{name} {calls}")
+        if profile == enc.enc_profile:
+            current = name
+    return (f"KMS calls per 1M {service} requests at "
+            f"{enc.enc_requests_per_second:g} req/s: {', '.join(estimates)} "
+            f"(using {current})")
@@ -0,0 +1,287 @@
+import compileall
+import fnmatch
+import hashlib
+import json
+import os
+import py_compile
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from aws_cdk import core
+
+from aws_cdk.aws_lambda import Code, LayerVersion, Runtime
+
+from .construct_config import ConfigError, LambdaConfig, load_config
+
+# Constants
+RUNTIME = Runtime.PYTHON_3_8
+RUNTIME_PYTHON_VERSION = (3, 8)
+LOCKFILE_NAMES = ["requirements.lock", "requirements.txt"]
+PIP_PLATFORMS = {
+    None: "manylinux2014_x86_64",
+    "x86_64": "manylinux2014_x86_64",
+    "arm64": "manylinux2014_aarch64",
+}
+CHUNK_SIZE = 1024 * 1024
+# Where Lambda mounts the function and its layers
+FUNCTION_ROOT = "/var/task"
+LAYER_ROOT = "/opt"
+# Bump when the staging rules change so old cache entries are not reused
+BUNDLE_FORMAT_VERSION = "3"
+
+# Never needed at runtime, dropped from the function source
+STRIP_DIRS = {"tests", "test", "docs", "doc", "examples"}
+STRIP_FILES = ["*.pyi", "*.md", "*.rst", "*.c", "*.h", "*.pyx"]
+# Installed packages only lose what is never imported: type stubs, stub
+# only distributions and test packages nested in a package. Docs stay,
+# botocore for one imports its docs package at load.
+LAYER_STRIP_DIRS = {"tests", "test"}
+LAYER_STRIP_FILES = ["*.pyi"]
+STUBS_SUFFIX = "-stubs"
+# Nested test packages that are part of a package's public API, kept along
+# with fn_bundle_keep. future.moves.test.support re-exports this one.
+LAYER_KEEP = ["future/backports/test"]
+# Written by the synth interpreter, dropped from the function and the layer
+BYTECODE_DIRS = {"__pycache__"}
+BYTECODE_FILES = ["*.pyc", "*.pyo"]
+
+
+class LambdaBundlingConstruct(core.Construct):
+    def __init__(self, scope: core.Construct, construct_id: str,
+                 lambda_context: str, **kwargs) -> None:
+        super().__init__(scope, construct_id, **kwargs)
+
+        fn = load_config(self, LambdaConfig, lambda_context)
+
+        if fn.fn_requirements and not os.path.isfile(
+                os.path.join(fn.fn_path, fn.fn_requirements)):
+            raise ConfigError(lambda_context, [
+                f"fn_requirements: '{fn.fn_requirements}' not found in "
+                f"'{fn.fn_path}'"
+            ])
+
+        cache_dir = fn.fn_bundle_cache_dir or os.path.join(
+            tempfile.gettempdir(), "cdk-lambda-cache")
+
+        # Bytecode is only loaded by the interpreter version that wrote it
+        precompile = fn.fn_bundle_precompile
+        if precompile and sys.version_info[:2] != RUNTIME_PYTHON_VERSION:
+            core.Annotations.of(self).add_warning(
+                "Skipping bytecode precompilation, synth runs Python "
+                f"{sys.version_info[0]}.{sys.version_info[1]} but the "
+                f"function runs {RUNTIME.name}")
+            precompile = False
+
+        lockfile = self.find_lockfile(fn.fn_path, fn.fn_requirements)
+        exclude = list(fn.fn_bundle_exclude)
+        keep = LAYER_KEEP + fn.fn_bundle_keep
+        self.layer = None
+
+        # Third party dependencies go to a layer keyed by the lockfile, so a
+        # handler change ships only the handler
+        if lockfile:
+            layer_key = self.digest([
+                BUNDLE_FORMAT_VERSION,
+                RUNTIME.name,
+                PIP_PLATFORMS[fn.fn_architecture],
+                str(precompile),
+                json.dumps(exclude),
+                json.dumps(keep),
+                self.file_digest(lockfile),
+            ])
+            layer_dir = self.cached(
+                cache_dir, "layer-" + layer_key,
+                lambda target: self.build_layer(
+                    lockfile, target, PIP_PLATFORMS[fn.fn_architecture],
+                    exclude, keep, precompile))
+            self.layer = LayerVersion(
+                self,
+                "DependenciesLayer",
+                code=Code.from_asset(
+                    layer_dir,
+                    asset_hash=layer_key,
+                    asset_hash_type=core.AssetHashType.CUSTOM),
+                compatible_runtimes=[RUNTIME],
+                description=f"{fn.fn_name} dependencies {layer_key[:12]}",
+            )
+
+            # Vendored copies of the same packages are left out of the
+            # function, along with the lockfile itself
+            exclude += self.vendored_packages(fn.fn_path)
+            exclude.append(os.path.relpath(lockfile, fn.fn_path))
+
+        files = list(self.walk_source(fn.fn_path, exclude))
+        code_key = self.digest([
+            BUNDLE_FORMAT_VERSION,
+            RUNTIME.name,
+            str(precompile),
+        ] + [key + ":" + self.file_digest(path) for key, path in files])
+        code_dir = self.cached(
+            cache_dir, "code-" + code_key,
+            lambda target: self.stage_files(files, target, precompile,
+                                            FUNCTION_ROOT))
+
+        # The key already covers every staged byte, so CDK does not re-hash
+        self.code = Code.from_asset(code_dir,
+                                    asset_hash=code_key,
+                                    asset_hash_type=core.AssetHashType.CUSTOM)
+
+    @staticmethod
+    def find_lockfile(fn_path: str, requirements: str = None) -> str:
+        if requirements:
+            return os.path.join(fn_path, requirements)
+        for name in LOCKFILE_NAMES:
+            path = os.path.join(fn_path, name)
+            if os.path.isfile(path):
+                return path
+        return None
+
+    @staticmethod
+    def vendored_packages(fn_path: str) -> list:
+        # Anything pip installed into the source directory has a dist-info
+        # with a RECORD of the top level paths it wrote
+        vendored = set()
+        for name in os.listdir(fn_path):
+            record = os.path.join(fn_path, name, "RECORD")
+            if not name.endswith(".dist-info") or not os.path.isfile(record):
+                continue
+            vendored.add(name)
+            with open(record) as f:
+                for line in f:
+                    top_level = line.split(",")[0].split("/")[0]
+                    if top_level and not top_level.startswith(".."):
+                        vendored.add(top_level)
+        return sorted(vendored)
+
+    @staticmethod
+    def walk_source(source_dir: str, exclude: list, strip: bool = True):
+        # strip drops STRIP_DIRS at the top level and STRIP_FILES anywhere
+        strip_dirs = BYTECODE_DIRS | STRIP_DIRS if strip else BYTECODE_DIRS
+        strip_files = BYTECODE_FILES + STRIP_FILES if strip \
+            else BYTECODE_FILES
+        for root, dirs, files in os.walk(source_dir):
+            rel_root = os.path.relpath(root, source_dir)
+            skip_dirs = strip_dirs if rel_root == "." else BYTECODE_DIRS
+            dirs[:] = sorted(
+                name for name in dirs if name not in skip_dirs and
+                not LambdaBundlingConstruct.excluded(
+                    os.path.normpath(os.path.join(rel_root, name)), exclude))
+            for name in sorted(files):
+                key = os.path.normpath(os.path.join(rel_root, name))
+                if any(fnmatch.fnmatch(name, pattern)
+                       for pattern in strip_files) or \
+                        LambdaBundlingConstruct.excluded(key, exclude):
+                    continue
+                yield key.replace(os.sep, "/"), os.path.join(root, name)
+
+    @staticmethod
+    def walk_packages(install_dir: str, exclude: list, keep: list):
+        for key, path in LambdaBundlingConstruct.walk_source(install_dir,
+                                                             exclude,
+                                                             strip=False):
+            parts = key.split("/")
+            stripped = parts[0].endswith(STUBS_SUFFIX) or \
+                any(part in LAYER_STRIP_DIRS for part in parts[1:-1]) or \
+                any(fnmatch.fnmatch(parts[-1], pattern)
+                    for pattern in LAYER_STRIP_FILES)
+            if not stripped or any(
+                    key.startswith(kept.rstrip("/") + "/") for kept in keep):
+                yield key, path
+
+    @staticmethod
+    def excluded(key: str, exclude: list) -> bool:
+        key = key.replace(os.sep, "/")
+        return any(
+            fnmatch.fnmatch(key, pattern) or key == pattern.rstrip("/")
+            for pattern in exclude)
+
+    @staticmethod
+    def stage_files(files: list, target: str, precompile: bool,
+                    runtime_root: str) -> None:
+        for key, path in files:
+            staged = os.path.join(target, key)
+            os.makedirs(os.path.dirname(staged), exist_ok=True)
+            shutil.copy2(path, staged)
+        if precompile:
+            LambdaBundlingConstruct.precompile(target, runtime_root)
+
+    @staticmethod
+    def build_layer(lockfile: str, target: str, platform: str, exclude: list,
+                    keep: list, precompile: bool) -> None:
+        # Layers are mounted at /opt, python/ is on the runtime's sys.path
+        work_dir = tempfile.mkdtemp(prefix="cdk-layer-")
+        install_dir = os.path.join(work_dir, "python")
+        try:
+            subprocess.run([
+                sys.executable, "-m", "pip", "install", "--quiet",
+                "--disable-pip-version-check", "--no-compile", "--requirement",
+                lockfile, "--target", install_dir, "--platform", platform,
+                "--implementation", "cp", "--python-version",
+                "%d.%d" % RUNTIME_PYTHON_VERSION, "--only-binary=:all:"
+            ],
+                           check=True)
+
+            files = LambdaBundlingConstruct.walk_packages(
+                install_dir, exclude, keep)
+            LambdaBundlingConstruct.stage_files(
+                [("python/" + key, path) for key, path in files], target,
+                precompile, LAYER_ROOT)
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    @staticmethod
+    def precompile(target: str, runtime_root: str) -> None:
+        # Hash based pycs do not embed mtimes and the source paths are the
+        # runtime ones, so the same sources always produce the same bytes
+        compileall.compile_dir(
+            target,
+            ddir=runtime_root,
+            quiet=1,
+            workers=0,
+            invalidation_mode=py_compile.PycInvalidationMode.UNCHECKED_HASH)
+
+    @staticmethod
+    def cached(cache_dir: str, name: str, build) -> str:
+        # Built once per content hash, later synths reuse the directory
+        target = os.path.join(cache_dir, name)
+        if os.path.isdir(target):
+            return target
+
+        os.makedirs(cache_dir, exist_ok=True)
+        partial = tempfile.mkdtemp(prefix=name + ".", dir=cache_dir)
+        try:
+            build(partial)
+        except BaseException:
+            shutil.rmtree(partial, ignore_errors=True)
+            raise
+
+        try:
+            os.rename(partial, target)
+        except OSError:
+            # Another synth finished the same entry first
+            shutil.rmtree(partial, ignore_errors=True)
+            if not os.path.isdir(target):
+                raise
+        return target
+
+    @staticmethod
+    def digest(parts: list) -> str:
+        return hashlib.sha256("\n".join(parts).encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def file_digest(path: str) -> str:
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    @property
+    def main_code(self) -> Code:
+        return self.code
+
+    @property
+    def main_layer(self) -> LayerVersion:
+        return self.layer
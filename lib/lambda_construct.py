@@ -1,5 +1,9 @@
+import json
 import os
-from aws_cdk import (core, aws_lambda as _lambda, aws_sqs as _sqs)
+import typing
+from aws_cdk import (core, aws_iam as _iam, aws_lambda as _lambda,
+                     aws_sqs as _sqs, aws_applicationautoscaling as _appscaling,
+                     region_info)
 
 from aws_cdk.core import Duration
 
@@ -10,7 +14,37 @@ from aws_cdk.aws_lambda import (
     Tracing,
 )
 
+from .construct_config import (LambdaConfig, LAMBDA_INSIGHTS_LAYER_VERSION,
+                               LAMBDA_INSIGHTS_ARM64_LAYER_VERSION, load_config)
+
+# aws_codedeploy is only loaded when traffic shifting is enabled
+if typing.TYPE_CHECKING:
+    from aws_cdk import aws_codedeploy as _codedeploy
+
 # Constants
+# Lambda Insights extension publisher, a few regions use their own account
+LAMBDA_INSIGHTS_ACCOUNT = "580247275435"
+LAMBDA_INSIGHTS_REGION_ACCOUNTS = {
+    "af-south-1": "012438385374",
+    "ap-east-1": "519774774795",
+    "cn-north-1": "488211338238",
+    "cn-northwest-1": "488211338238",
+    "eu-south-1": "339249233099",
+    "me-south-1": "285320876703",
+    "us-gov-east-1": "122132214140",
+    "us-gov-west-1": "751350123760",
+}
+# Traffic shifting configs CodeDeploy predefines, others are created
+PREDEFINED_DEPLOYMENT_CONFIGS = {
+    ("CANARY", 10, 5): "CANARY_10_PERCENT_5_MINUTES",
+    ("CANARY", 10, 10): "CANARY_10_PERCENT_10_MINUTES",
+    ("CANARY", 10, 15): "CANARY_10_PERCENT_15_MINUTES",
+    ("CANARY", 10, 30): "CANARY_10_PERCENT_30_MINUTES",
+    ("LINEAR", 10, 1): "LINEAR_10_PERCENT_EVERY_1_MINUTE",
+    ("LINEAR", 10, 2): "LINEAR_10_PERCENT_EVERY_2_MINUTES",
+    ("LINEAR", 10, 3): "LINEAR_10_PERCENT_EVERY_3_MINUTES",
+    ("LINEAR", 10, 10): "LINEAR_10_PERCENT_EVERY_10_MINUTES",
+}
 
 
 class LambdaConstruct(core.Construct):
@@ -18,45 +52,242 @@ class LambdaConstruct(core.Construct):
                  lambda_context: str, **kwargs) -> None:
         super().__init__(scope, construct_id, **kwargs)
 
-        fn = dict(self.node.try_get_context(lambda_context))
+        fn = load_config(self, LambdaConfig, lambda_context)
 
         # lambda dlq
         lambda_fn_dlq = _sqs.Queue(self,
-                                   fn["fn_dlq_name"],
-                                   queue_name=fn["fn_dlq_name"])
+                                   fn.fn_dlq_name,
+                                   queue_name=fn.fn_dlq_name)
+
+        # Bundled code leaves tests, docs and dependencies out of the zip,
+        # the dependencies ship in a layer keyed by the lockfile
+        code = Code.from_asset(fn.fn_path)
+        layers = []
+        if fn.fn_bundling:
+            from .lambda_bundling_construct import LambdaBundlingConstruct
+            bundle = LambdaBundlingConstruct(self, "Bundle", lambda_context)
+            code = bundle.main_code
+            if bundle.main_layer:
+                layers.append(bundle.main_layer)
 
         lambda_fn = Function(
             self,
-            fn["fn_name"],
-            function_name=fn["fn_name"],
+            fn.fn_name,
+            function_name=fn.fn_name,
             runtime=Runtime.PYTHON_3_8,
-            handler=fn["fn_handler"],
-            code=Code.from_asset(fn["fn_path"]),
-            tracing=Tracing.ACTIVE,
+            handler=fn.fn_handler,
+            code=code,
+            layers=layers or None,
+            tracing=getattr(Tracing, fn.fn_tracing),
             current_version_options={
                 "removal_policy": core.RemovalPolicy.RETAIN
             },
             environment={
                 "ENVIRONMENT_VALUE": "DUMMY_VALUE",
+                **self.emf_environment(fn),
             },
             dead_letter_queue=lambda_fn_dlq,
-            retry_attempts=fn["fn_retry_attempts"],
-            timeout=Duration.seconds(fn["fn_timeout"]),
-            reserved_concurrent_executions=fn["fn_reserved_concurrency"])
+            retry_attempts=fn.fn_retry_attempts,
+            timeout=Duration.seconds(fn.fn_timeout),
+            memory_size=fn.fn_memory_size,
+            reserved_concurrent_executions=fn.fn_reserved_concurrency)
+
+        # Architectures and ephemeral storage are not on the 1.95 L2
+        # Function yet, set them on the L1
+        if fn.fn_architecture:
+            lambda_fn.node.default_child.add_property_override(
+                "Architectures", [fn.fn_architecture])
+        if fn.fn_ephemeral_storage:
+            lambda_fn.node.default_child.add_property_override(
+                "EphemeralStorage.Size", fn.fn_ephemeral_storage)
+
+        # Lambda Insights extension, per invocation CPU, memory, network and
+        # init duration in the LambdaInsights namespace
+        if fn.fn_insights:
+            lambda_fn.add_layers(
+                _lambda.LayerVersion.from_layer_version_arn(
+                    self, "LambdaInsightsLayer",
+                    fn.fn_insights_layer_arn or self.insights_layer_arn(
+                        fn.fn_insights_layer_version, fn.fn_architecture)))
+            lambda_fn.role.add_managed_policy(
+                _iam.ManagedPolicy.from_aws_managed_policy_name(
+                    "CloudWatchLambdaInsightsExecutionRolePolicy"))
+
+        # Sampling rules keep tracing cost bounded, the reservoir guarantees
+        # a few traces per second and the fixed rate samples the rest
+        for rule in fn.fn_sampling_rules:
+            core.CfnResource(
+                self,
+                rule.name + "SamplingRule",
+                type="AWS::XRay::SamplingRule",
+                properties={
+                    "SamplingRule": {
+                        "RuleName": rule.name,
+                        "Priority": rule.priority,
+                        "FixedRate": rule.fixed_rate,
+                        "ReservoirSize": rule.reservoir_size,
+                        "ServiceName": rule.service_name or fn.fn_name,
+                        "ServiceType": rule.service_type,
+                        "Host": rule.host,
+                        "HTTPMethod": rule.http_method,
+                        "URLPath": rule.url_path,
+                        "ResourceARN": "*",
+                        "Version": 1,
+                    }
+                })
 
-        lambda_fn_alias = lambda_fn.current_version.add_alias(fn["fn_alias"])
+        lambda_fn_alias = lambda_fn.current_version.add_alias(
+            fn.fn_alias,
+            # Provisioned concurrency on the alias, 0 keeps it disabled
+            provisioned_concurrent_executions=fn.fn_provisioned_concurrency
+            or None)
+
+        # Target tracking on ProvisionedConcurrencyUtilization plus
+        # scheduled min/max windows for known peaks
+        if fn.fn_provisioned_concurrency and fn.fn_pc_autoscaling:
+            pc_scaling = lambda_fn_alias.add_auto_scaling(
+                min_capacity=fn.pc_min_capacity,
+                max_capacity=fn.fn_pc_max_capacity,
+            )
+
+            pc_scaling.scale_on_utilization(
+                utilization_target=fn.fn_pc_target_utilization)
+
+            for window in fn.fn_pc_schedules:
+                pc_scaling.scale_on_schedule(
+                    window.name,
+                    schedule=_appscaling.Schedule.expression(window.schedule),
+                    min_capacity=window.min_capacity,
+                    max_capacity=window.max_capacity,
+                )
+
+        # Canary or linear traffic shifting on the alias, rolled back when
+        # the new version errors or slows down
+        self.deployment_group = None
+        if fn.fn_deployment_type:
+            self.deployment_group = self.add_deployment_group(
+                fn, lambda_fn_alias)
 
         lambda_fn_dlq.grant_send_messages(lambda_fn)
 
         # # Outputs
 
         core.CfnOutput(self,
-                       fn["fn_name"] + 'Arn',
+                       fn.fn_name + 'Arn',
                        value=(lambda_fn.function_arn))
 
         self._function = lambda_fn
         self._function_alias = lambda_fn_alias
         self._function_dlq = lambda_fn_dlq
+        self._function_timeout = Duration.seconds(fn.fn_timeout)
+        self._function_config = fn
+
+    def add_deployment_group(
+            self, fn: LambdaConfig,
+            alias: _lambda.Alias) -> "_codedeploy.LambdaDeploymentGroup":
+        from aws_cdk import aws_cloudwatch as _cw, aws_codedeploy as _codedeploy
+
+        predefined = PREDEFINED_DEPLOYMENT_CONFIGS.get(
+            (fn.fn_deployment_type, fn.fn_deployment_percentage,
+             fn.fn_deployment_interval))
+        if fn.fn_deployment_type == "ALL_AT_ONCE":
+            deployment_config = _codedeploy.LambdaDeploymentConfig.ALL_AT_ONCE
+        elif predefined:
+            deployment_config = getattr(_codedeploy.LambdaDeploymentConfig,
+                                        predefined)
+        else:
+            deployment_config = _codedeploy.CustomLambdaDeploymentConfig(
+                self,
+                "DeploymentConfig",
+                type=getattr(_codedeploy.CustomLambdaDeploymentConfigType,
+                             fn.fn_deployment_type),
+                percentage=fn.fn_deployment_percentage,
+                interval=Duration.minutes(fn.fn_deployment_interval))
+
+        # Alarms watch the alias, which carries both versions while traffic
+        # shifts, on one minute datapoints so a bad version rolls back early
+        alarm_options = dict(
+            evaluation_periods=fn.fn_deployment_evaluation_periods,
+            comparison_operator=_cw.ComparisonOperator.GREATER_THAN_THRESHOLD,
+            treat_missing_data=_cw.TreatMissingData.NOT_BREACHING,
+        )
+        alarms = [
+            alias.metric_errors(period=Duration.minutes(1)).create_alarm(
+                self,
+                "DeploymentErrorsAlarm",
+                alarm_description=f"{fn.fn_name}:{fn.fn_alias} errors during "
+                "deployment",
+                threshold=fn.fn_deployment_error_threshold,
+                **alarm_options)
+        ]
+        if fn.fn_deployment_p99_duration_ms:
+            alarms.append(
+                alias.metric_duration(
+                    statistic="p99",
+                    period=Duration.minutes(1)).create_alarm(
+                        self,
+                        "DeploymentDurationP99Alarm",
+                        alarm_description=(
+                            f"{fn.fn_name}:{fn.fn_alias} p99 duration above "
+                            f"{fn.fn_deployment_p99_duration_ms} ms"),
+                        threshold=fn.fn_deployment_p99_duration_ms,
+                        **alarm_options))
+
+        return _codedeploy.LambdaDeploymentGroup(
+            self,
+            "DeploymentGroup",
+            alias=alias,
+            deployment_config=deployment_config,
+            alarms=alarms,
+            auto_rollback=_codedeploy.AutoRollbackConfig(
+                failed_deployment=True,
+                stopped_deployment=True,
+                deployment_in_alarm=True))
+
+    @staticmethod
+    def emf_environment(fn: LambdaConfig) -> dict:
+        # Read by aws-embedded-metrics and Powertools, the dimensions are
+        # for the handler to put on every metric it emits
+        if not fn.fn_emf_namespace:
+            return {}
+        return {
+            "AWS_EMF_NAMESPACE": fn.fn_emf_namespace,
+            "AWS_EMF_SERVICE_NAME": fn.fn_name,
+            "POWERTOOLS_METRICS_NAMESPACE": fn.fn_emf_namespace,
+            "POWERTOOLS_SERVICE_NAME": fn.fn_name,
+            "EMF_DIMENSIONS": json.dumps(fn.fn_emf_dimensions,
+                                         sort_keys=True),
+        }
+
+    def insights_layer_arn(self, layer_version: int,
+                           architecture: str) -> str:
+        layer_name = "LambdaInsightsExtension"
+        default_version = LAMBDA_INSIGHTS_LAYER_VERSION
+        if architecture == "arm64":
+            layer_name = "LambdaInsightsExtension-Arm64"
+            default_version = LAMBDA_INSIGHTS_ARM64_LAYER_VERSION
+
+        region = core.Stack.of(self).region
+        if core.Token.is_unresolved(region):
+            # Environment agnostic stack, look the account up at deploy
+            accounts = core.CfnMapping(
+                self,
+                "LambdaInsightsAccounts",
+                mapping={
+                    info.name: {
+                        "account":
+                        LAMBDA_INSIGHTS_REGION_ACCOUNTS.get(
+                            info.name, LAMBDA_INSIGHTS_ACCOUNT)
+                    }
+                    for info in region_info.RegionInfo.regions
+                })
+            account = accounts.find_in_map(core.Aws.REGION, "account")
+        else:
+            account = LAMBDA_INSIGHTS_REGION_ACCOUNTS.get(
+                region, LAMBDA_INSIGHTS_ACCOUNT)
+        return (f"arn:{core.Aws.PARTITION}:lambda:{core.Aws.REGION}:"
+                f"{account}:layer:{layer_name}:"
+                f"{layer_version or default_version}")
 
     @property
     def main_function(self) -> _lambda.IFunction:
@@ -69,3 +300,15 @@ class LambdaConstruct(core.Construct):
     @property
     def main_function_dlq(self) -> _sqs.IQueue:
         return self._function_dlq
+
+    @property
+    def main_function_timeout(self) -> Duration:
+        return self._function_timeout
+
+    @property
+    def main_function_config(self) -> LambdaConfig:
+        return self._function_config
+
+    @property
+    def main_deployment_group(self) -> "_codedeploy.LambdaDeploymentGroup":
+        return self.deployment_group
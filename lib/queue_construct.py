@@ -1,39 +1,142 @@
+import typing
+
 from aws_cdk import (core, aws_sqs as _sqs)
 
 from aws_cdk.core import Duration
 
+# aws_lambda is only loaded when a consumer is attached
+if typing.TYPE_CHECKING:
+    from aws_cdk import aws_lambda as _lambda
+
+from .construct_config import EncryptionConfig, QueueConfig, load_config
+from .kms_call_estimator import kms_report
+
 
 class QueueConstruct(core.Construct):
-    def __init__(self, scope: core.Construct, construct_id: str,
-                 queue_context: str, **kwargs) -> None:
+    def __init__(self,
+                 scope: core.Construct,
+                 construct_id: str,
+                 queue_context: str,
+                 consumer_fn: "_lambda.IFunction" = None,
+                 consumer_fn_timeout: Duration = None,
+                 encryption_context: str = None,
+                 **kwargs) -> None:
         super().__init__(scope, construct_id, **kwargs)
 
-        q = dict(self.node.try_get_context(queue_context))
+        # The visibility timeout is sized from the consumer's timeout
+        if consumer_fn and consumer_fn_timeout is None:
+            raise ValueError(
+                "consumer_fn_timeout is required with a consumer_fn")
+
+        q = load_config(self, QueueConfig, queue_context)
+        enc = load_config(self, EncryptionConfig, encryption_context) \
+            if encryption_context else EncryptionConfig()
+        if encryption_context:
+            core.Annotations.of(self).add_info(kms_report("sqs", enc))
+
+        # Consumer batching, only used when a consumer function is passed in
+        batching_window = q.queue_consumer_max_batching_window
+
+        visibility_timeout = Duration.seconds(q.queue_visibility_timeout)
 
-        queue_dlq = _sqs.Queue(self,
-                               q["queue_dlq_name"],
-                               queue_name=q["queue_dlq_name"])
+        if consumer_fn:
+            # A message stays invisible while the whole batch is gathered and
+            # processed, including Lambda's own retries on throttling
+            visibility_timeout = Duration.seconds(
+                max(q.queue_visibility_timeout,
+                    consumer_fn_timeout.to_seconds() * 6 + batching_window))
+
+        # A longer data key reuse period means fewer KMS calls per message
+        encryption = getattr(_sqs.QueueEncryption, enc.queue_encryption)
+        data_key_reuse = Duration.seconds(enc.queue_data_key_reuse) \
+            if enc.queue_data_key_reuse else None
+
+        # A FIFO queue can only redrive to a FIFO dead letter queue, it is
+        # only encrypted when an encryption profile is passed in
+        queue_dlq = _sqs.Queue(
+            self,
+            q.queue_dlq_name,
+            queue_name=q.physical_name(q.queue_dlq_name),
+            fifo=q.queue_fifo or None,
+            encryption=encryption if encryption_context else None,
+            data_key_reuse=data_key_reuse if encryption_context else None,
+        )
+        if encryption_context:
+            self.enable_managed_sse(queue_dlq, enc)
 
         queue = _sqs.Queue(
             self,
-            q["queue_name"],
-            queue_name=q["queue_name"],
+            q.queue_name,
+            queue_name=q.physical_name(q.queue_name),
             dead_letter_queue=_sqs.DeadLetterQueue(
-                max_receive_count=q["queue_dlq_max_receive_count"],
+                max_receive_count=q.queue_dlq_max_receive_count,
                 queue=queue_dlq),
-            encryption=_sqs.QueueEncryption.KMS_MANAGED,
-            visibility_timeout=Duration.seconds(30),
-            delivery_delay=Duration.seconds(15),
-            retention_period=Duration.hours(14),
+            encryption=encryption,
+            data_key_reuse=data_key_reuse,
+            visibility_timeout=visibility_timeout,
+            delivery_delay=Duration.seconds(q.queue_delivery_delay),
+            retention_period=Duration.seconds(q.queue_retention_period),
+            receive_message_wait_time=Duration.seconds(
+                q.queue_receive_wait_time),
+            fifo=q.queue_fifo or None,
+            content_based_deduplication=q.queue_content_based_deduplication
+            or None,
         )
 
+        self.enable_managed_sse(queue, enc)
+
+        # High throughput FIFO settings are not on the 1.95 L2 queue yet
+        if q.queue_deduplication_scope:
+            queue.node.default_child.add_property_override(
+                "DeduplicationScope", q.queue_deduplication_scope)
+        if q.queue_fifo_throughput_limit:
+            queue.node.default_child.add_property_override(
+                "FifoThroughputLimit", q.queue_fifo_throughput_limit)
+
         self.queue = queue
         self.queue_dlq = queue_dlq
+        self.consumer_mapping = None
+
+        # Event source mapping between the queue and the consumer function
+        if consumer_fn:
+            from aws_cdk.aws_lambda import EventSourceMapping
+
+            consumer_mapping = EventSourceMapping(
+                self,
+                q.queue_name + "Consumer",
+                target=consumer_fn,
+                event_source_arn=queue.queue_arn,
+                batch_size=q.queue_consumer_batch_size,
+                max_batching_window=Duration.seconds(batching_window)
+                if batching_window else None,
+            )
+            cfn_mapping = consumer_mapping.node.default_child
+
+            if q.queue_consumer_report_batch_item_failures:
+                cfn_mapping.add_property_override(
+                    "FunctionResponseTypes", ["ReportBatchItemFailures"])
+
+            if q.queue_consumer_max_concurrency:
+                cfn_mapping.add_property_override(
+                    "ScalingConfig.MaximumConcurrency",
+                    q.queue_consumer_max_concurrency)
+
+            queue.grant_consume_messages(consumer_fn)
+
+            self.consumer_mapping = consumer_mapping
 
         # Outputs
 
         core.CfnOutput(self, "QueueUrl", value=queue.queue_url)
 
+    @staticmethod
+    def enable_managed_sse(queue: _sqs.Queue, enc: EncryptionConfig) -> None:
+        # SQS managed SSE makes no KMS calls, the 1.95 L2 queue has no
+        # member for it
+        if enc.queue_encryption == "UNENCRYPTED":
+            queue.node.default_child.add_property_override(
+                "SqsManagedSseEnabled", True)
+
     @property
     def main_queue(self) -> _sqs.IQueue:
         return self.queue
@@ -41,3 +144,7 @@ class QueueConstruct(core.Construct):
     @property
     def main_queue_dlq(self) -> _sqs.IQueue:
         return self.queue_dlq
+
+    @property
+    def main_consumer_mapping(self) -> "_lambda.IEventSourceMapping":
+        return self.consumer_mapping
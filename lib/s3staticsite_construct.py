@@ -1,40 +1,79 @@
+import json
+import re
+
 from aws_cdk import (core, aws_s3 as _s3, aws_iam as _iam, aws_cloudfront as
                      _cfront, aws_cloudfront_origins as _cfront_origins)
 
-from aws_cdk.aws_cloudfront import (CfnCloudFrontOriginAccessIdentity,
-                                    PriceClass, SecurityPolicyProtocol,
-                                    GeoRestriction, AllowedMethods,
-                                    ViewerProtocolPolicy)
+from .construct_config import (SiteConfig, CachePolicyConfig,
+                               EncryptionConfig, OriginRequestPolicyConfig,
+                               load_config)
+from .kms_call_estimator import kms_report
+
+from aws_cdk.aws_cloudfront import (
+    CfnCloudFrontOriginAccessIdentity, PriceClass, SecurityPolicyProtocol,
+    GeoRestriction, AllowedMethods, ViewerProtocolPolicy, BehaviorOptions,
+    CachePolicy, CacheCookieBehavior, CacheHeaderBehavior,
+    CacheQueryStringBehavior, OriginRequestPolicy, OriginRequestCookieBehavior,
+    OriginRequestHeaderBehavior, OriginRequestQueryStringBehavior)
+
+# CloudFront Functions, ES 5.1 on the cloudfront-js-1.0 runtime
+FUNCTION_RUNTIME = "cloudfront-js-1.0"
+FUNCTION_NAME_MAX_LENGTH = 64
+# Client side routes have no file extension in their last segment
+SPA_ROUTING_FUNCTION = """function handler(event) {
+    var request = event.request;
+    var uri = request.uri;
+    if (uri.indexOf(".", uri.lastIndexOf("/")) === -1) {
+        request.uri = %s;
+    }
+    return request;
+}
+"""
+RESPONSE_HEADERS_FUNCTION = """var HEADERS = %s;
+
+function handler(event) {
+    var response = event.response;
+    for (var name in HEADERS) {
+        response.headers[name] = {value: HEADERS[name]};
+    }
+    return response;
+}
+"""
 
 
 class S3StaticSiteConstruct(core.Construct):
-    def __init__(self, scope: core.Construct, construct_id: str,
-                 ss_context: str, **kwargs) -> None:
+    def __init__(self,
+                 scope: core.Construct,
+                 construct_id: str,
+                 ss_context: str,
+                 encryption_context: str = None,
+                 **kwargs) -> None:
         super().__init__(scope, construct_id, **kwargs)
 
         # Access logging bucket for the S3 and Cloudfront
 
-        ss = dict(self.node.try_get_context(ss_context))
+        ss = load_config(self, SiteConfig, ss_context)
+
+        enc = load_config(self, EncryptionConfig, encryption_context) \
+            if encryption_context else EncryptionConfig()
+        bucket_encryption = getattr(_s3.BucketEncryption,
+                                    enc.bucket_encryption)
+        if encryption_context:
+            core.Annotations.of(self).add_info(kms_report("s3", enc))
 
-        allowed_methods = AllowedMethods.ALLOW_GET_HEAD if ss[
-            "cfront_allowed_methods"] == "ALLOW_GET_HEAD" else AllowedMethods.ALLOW_GET_HEAD_OPTIONS if ss[
-                "cfront_allowed_methods"] == "ALLOW_GET_HEAD_OPTIONS" else AllowedMethods.ALLOW_ALL
+        allowed_methods = getattr(AllowedMethods, ss.cfront_allowed_methods)
 
-        viewer_policy = ViewerProtocolPolicy.REDIRECT_TO_HTTPS if ss[
-            "cfront_viewer_policy"] == "REDIRECT_TO_HTTPS" else ViewerProtocolPolicy.HTTPS_ONLY if ss[
-                "cfront_viewer_policy"] == "HTTPS_ONLY" else ViewerProtocolPolicy.ALLOW_ALL
+        viewer_policy = getattr(ViewerProtocolPolicy, ss.cfront_viewer_policy)
 
-        price_class = PriceClass.PRICE_CLASS_ALL if ss[
-            "cfront_price_class"] == "PRICE_CLASS_ALL" else PriceClass.PRICE_CLASS_200 if ss[
-                "cfront_price_class"] == "PRICE_CLASS_200" else PriceClass.PRICE_CLASS_100
+        price_class = getattr(PriceClass, ss.cfront_price_class)
 
         # Creating the access logs bucket
 
         access_log_bucket = _s3.Bucket(
             self,
-            ss["access_logs_bucket_name"],
-            bucket_name=ss["access_logs_bucket_name"],
-            encryption=_s3.BucketEncryption.KMS_MANAGED,
+            ss.access_logs_bucket_name,
+            bucket_name=ss.access_logs_bucket_name,
+            encryption=bucket_encryption,
             removal_policy=core.RemovalPolicy.DESTROY,
             auto_delete_objects=True,
         )
@@ -43,14 +82,25 @@ class S3StaticSiteConstruct(core.Construct):
 
         source_bucket = _s3.Bucket(
             self,
-            ss["static_site_bucket_name"],
-            bucket_name=ss["static_site_bucket_name"],
-            encryption=_s3.BucketEncryption.KMS_MANAGED,
+            ss.static_site_bucket_name,
+            bucket_name=ss.static_site_bucket_name,
+            encryption=bucket_encryption,
             removal_policy=core.RemovalPolicy.DESTROY,
             auto_delete_objects=True,
             versioned=True,
-            website_index_document=ss["website_index_document"],
-            website_error_document=ss["website_index_document"])
+            website_index_document=ss.website_index_document,
+            # Deep links are rewritten at the edge with SPA routing
+            website_error_document=None
+            if ss.cfront_spa_routing else ss.website_index_document)
+
+        # Bucket keys let S3 reuse a data key instead of calling KMS for
+        # every object request. The 1.95 L2 bucket only accepts them with
+        # a customer managed key, so they are set on the L1.
+        if enc.bucket_key_enabled:
+            for bucket in (access_log_bucket, source_bucket):
+                bucket.node.default_child.add_property_override(
+                    "BucketEncryption.ServerSideEncryptionConfiguration.0."
+                    "BucketKeyEnabled", True)
 
         bucket_origins = _cfront_origins.S3Origin(source_bucket)
 
@@ -60,30 +110,86 @@ class S3StaticSiteConstruct(core.Construct):
             self,
             "accessOriginOAI",
             cloud_front_origin_access_identity_config={
-                "comment": ss["cfront_origins_comment"]
+                "comment": ss.cfront_origins_comment
             })
 
+        # Cache and origin request policies per path pattern, the default
+        # behavior keeps the CloudFront defaults unless a policy is given
+        default_cache_policy = self.build_cache_policy(
+            "DefaultCachePolicy", ss.cfront_default_cache_policy
+        ) if ss.cfront_default_cache_policy else None
+
+        additional_behaviors = {
+            behavior.path_pattern: BehaviorOptions(
+                origin=bucket_origins,
+                allowed_methods=allowed_methods,
+                viewer_protocol_policy=viewer_policy,
+                compress=True,
+                cache_policy=self.build_cache_policy(
+                    f"CachePolicy{idx}", behavior.cache_policy),
+                origin_request_policy=self.build_origin_request_policy(
+                    f"OriginRequestPolicy{idx}",
+                    behavior.origin_request_policy)
+                if behavior.origin_request_policy else None,
+            )
+            for idx, behavior in enumerate(ss.cfront_behaviors)
+        }
+
         cfront_dist = _cfront.Distribution(
             self,
-            ss["cfront_distribution_name"],
+            ss.cfront_distribution_name,
             default_behavior={
                 "origin": bucket_origins,
                 "allowed_methods": allowed_methods,
-                "viewer_protocol_policy": viewer_policy
+                "viewer_protocol_policy": viewer_policy,
+                "compress": True,
+                "cache_policy": default_cache_policy,
             },
+            additional_behaviors=additional_behaviors or None,
             enable_ipv6=True,
             minimum_protocol_version=SecurityPolicyProtocol.TLS_V1_2_2019,
             price_class=price_class,
-            default_root_object=ss["cfront_root_object"],
-            comment=ss["cfront_dist_comment"],
+            default_root_object=ss.cfront_root_object,
+            comment=ss.cfront_dist_comment,
             log_bucket=access_log_bucket,
             log_includes_cookies=False,
-            log_file_prefix=ss["cfront_log_file_prefix"],
+            log_file_prefix=ss.cfront_log_file_prefix,
             # web_acl_id=,
             # certificate=,
-            geo_restriction=GeoRestriction.whitelist(ss["geo_whitelist"]),
+            geo_restriction=GeoRestriction.whitelist(ss.geo_whitelist),
         )
 
+        # Deep links are served from the edge cache instead of an origin 404
+        # and the error document. Headers are set on every behavior.
+        # CloudFront Functions have no construct in 1.95, so the
+        # associations are set on the L1 distribution.
+        behaviors = ["DefaultCacheBehavior"] + [
+            f"CacheBehaviors.{idx}" for idx in range(len(ss.cfront_behaviors))
+        ]
+        associations = {behavior: [] for behavior in behaviors}
+        if ss.cfront_spa_routing:
+            spa_routing = self.build_function(
+                "SpaRoutingFunction", ss,
+                SPA_ROUTING_FUNCTION % json.dumps("/" + ss.cfront_root_object))
+            associations["DefaultCacheBehavior"].append({
+                "EventType": "viewer-request",
+                "FunctionARN": spa_routing.get_att("FunctionARN"),
+            })
+        if ss.response_headers:
+            response_headers = self.build_function(
+                "ResponseHeadersFunction", ss, RESPONSE_HEADERS_FUNCTION %
+                json.dumps(ss.response_headers, indent=4))
+            for behavior in behaviors:
+                associations[behavior].append({
+                    "EventType": "viewer-response",
+                    "FunctionARN": response_headers.get_att("FunctionARN"),
+                })
+        for behavior, functions in associations.items():
+            if functions:
+                cfront_dist.node.default_child.add_property_override(
+                    f"DistributionConfig.{behavior}.FunctionAssociations",
+                    functions)
+
         # Bucket policy to restrict access to bucket - Use only cloudfront's Origin Access identity
         policy_statement = _iam.PolicyStatement()
         policy_statement.add_actions('s3:GetBucket*')
@@ -95,6 +201,19 @@ class S3StaticSiteConstruct(core.Construct):
             cfront_oai.attr_s3_canonical_user_id)
         source_bucket.add_to_resource_policy(policy_statement)
 
+        # Incremental deployment of the local build directory
+        if ss.site_build_dir:
+            # Pulls in s3 assets, lambda and custom resources, so it is only
+            # imported for sites that deploy content
+            from .s3staticsite_deployment_construct import \
+                S3StaticSiteDeploymentConstruct
+
+            S3StaticSiteDeploymentConstruct(self,
+                                            "SiteDeployment",
+                                            ss_context=ss_context,
+                                            source_bucket=source_bucket,
+                                            distribution=cfront_dist)
+
         # Outputs
 
         core.CfnOutput(self,
@@ -109,6 +228,77 @@ class S3StaticSiteConstruct(core.Construct):
         self.access_logs_bucket = access_log_bucket
         self.cfront_dist = cfront_dist
 
+    def build_function(self, function_id: str, ss: SiteConfig,
+                       code: str) -> core.CfnResource:
+        # Function names are account wide and limited to 64 characters
+        name = re.sub(r"[^\w-]", "-", ss.cfront_distribution_name)
+        name = name[:FUNCTION_NAME_MAX_LENGTH - len(function_id) - 1]
+        return core.CfnResource(
+            self,
+            function_id,
+            type="AWS::CloudFront::Function",
+            properties={
+                "Name": f"{name}-{function_id}",
+                "AutoPublish": True,
+                "FunctionCode": code,
+                "FunctionConfig": {
+                    "Comment": f"{ss.cfront_distribution_name} {function_id}",
+                    "Runtime": FUNCTION_RUNTIME,
+                },
+            })
+
+    def build_cache_policy(self, policy_id: str,
+                           policy: CachePolicyConfig) -> CachePolicy:
+        # Cache key allow lists: [] excludes, ["*"] includes all values
+        query_strings = policy.query_strings
+        cookies = policy.cookies
+        headers = policy.headers
+
+        return CachePolicy(
+            self,
+            policy_id,
+            comment=policy.comment,
+            min_ttl=core.Duration.seconds(policy.min_ttl),
+            default_ttl=core.Duration.seconds(policy.default_ttl),
+            max_ttl=core.Duration.seconds(policy.max_ttl),
+            query_string_behavior=CacheQueryStringBehavior.all()
+            if query_strings == ["*"] else
+            CacheQueryStringBehavior.allow_list(*query_strings)
+            if query_strings else CacheQueryStringBehavior.none(),
+            cookie_behavior=CacheCookieBehavior.all() if cookies == ["*"] else
+            CacheCookieBehavior.allow_list(*cookies)
+            if cookies else CacheCookieBehavior.none(),
+            header_behavior=CacheHeaderBehavior.allow_list(*headers)
+            if headers else CacheHeaderBehavior.none(),
+            enable_accept_encoding_gzip=True,
+            enable_accept_encoding_brotli=True,
+        )
+
+    def build_origin_request_policy(
+            self, policy_id: str,
+            policy: OriginRequestPolicyConfig) -> OriginRequestPolicy:
+        query_strings = policy.query_strings
+        cookies = policy.cookies
+        headers = policy.headers
+
+        return OriginRequestPolicy(
+            self,
+            policy_id,
+            comment=policy.comment,
+            query_string_behavior=OriginRequestQueryStringBehavior.all()
+            if query_strings == ["*"] else
+            OriginRequestQueryStringBehavior.allow_list(*query_strings)
+            if query_strings else OriginRequestQueryStringBehavior.none(),
+            cookie_behavior=OriginRequestCookieBehavior.all()
+            if cookies == ["*"] else
+            OriginRequestCookieBehavior.allow_list(*cookies)
+            if cookies else OriginRequestCookieBehavior.none(),
+            header_behavior=OriginRequestHeaderBehavior.all()
+            if headers == ["*"] else
+            OriginRequestHeaderBehavior.allow_list(*headers)
+            if headers else OriginRequestHeaderBehavior.none(),
+        )
+
     @property
     def main_source_bucket(self) -> _s3.IBucket:
         return self.bucket
@@ -0,0 +1,156 @@
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import shutil
+import tempfile
+
+from aws_cdk import (core, aws_s3 as _s3, aws_s3_assets as _s3_assets,
+                     aws_iam as _iam, aws_cloudfront as _cfront,
+                     custom_resources as _cr)
+
+from aws_cdk.aws_lambda import Runtime, Code, Function
+
+from .construct_config import SiteConfig, load_config
+
+# Constants
+HANDLER_PATH = os.path.join(os.path.dirname(__file__),
+                            "s3staticsite_deployment_handler")
+CHUNK_SIZE = 1024 * 1024
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+class S3StaticSiteDeploymentConstruct(core.Construct):
+    def __init__(self, scope: core.Construct, construct_id: str,
+                 ss_context: str, source_bucket: _s3.IBucket,
+                 distribution: _cfront.IDistribution, **kwargs) -> None:
+        super().__init__(scope, construct_id, **kwargs)
+
+        ss = load_config(self, SiteConfig, ss_context)
+
+        hashed_pattern = re.compile(ss.site_hashed_file_pattern)
+        cache_control_rules = [(re.compile(rule.pattern), rule.cache_control)
+                               for rule in ss.site_cache_control_rules]
+
+        # Stage the build directory with the manifest the deployment handler
+        # diffs against. CDK copies it into the cloud assembly when the
+        # asset is created, so the staging directory is removed right after.
+        # Compression is left to CloudFront.
+        with tempfile.TemporaryDirectory(prefix="cdk-site-") as staging_dir:
+            manifest = {}
+            for key, path in self.walk_build_dir(ss.site_build_dir):
+                immutable = bool(hashed_pattern.search(key))
+                cache_control = next(
+                    (control
+                     for pattern, control in cache_control_rules
+                     if pattern.search(key)),
+                    IMMUTABLE_CACHE_CONTROL
+                    if immutable else ss.site_default_cache_control)
+                content_type = mimetypes.guess_type(
+                    key)[0] or "application/octet-stream"
+
+                self.stage_file(path, os.path.join(staging_dir, key))
+                manifest[key] = {
+                    "hash": self.file_digest(path),
+                    "cache_control": cache_control,
+                    "content_type": content_type,
+                    "immutable": immutable,
+                }
+
+            manifest_body = json.dumps(manifest, sort_keys=True)
+            self.write_manifest(
+                os.path.join(staging_dir, ss.site_manifest_key),
+                manifest_body)
+
+            # The manifest covers every staged byte, so CDK does not re-hash
+            site_asset = _s3_assets.Asset(
+                self,
+                "SiteAsset",
+                path=staging_dir,
+                asset_hash=hashlib.sha256(
+                    manifest_body.encode("utf-8")).hexdigest(),
+                asset_hash_type=core.AssetHashType.CUSTOM,
+            )
+
+        deployment_fn = Function(
+            self,
+            "SiteDeploymentHandler",
+            runtime=Runtime.PYTHON_3_8,
+            handler="index.handler",
+            code=Code.from_asset(HANDLER_PATH),
+            timeout=core.Duration.minutes(15),
+            memory_size=ss.site_deploy_memory,
+        )
+        site_asset.grant_read(deployment_fn)
+        source_bucket.grant_read_write(deployment_fn)
+        source_bucket.grant_delete(deployment_fn)
+        deployment_fn.add_to_role_policy(
+            _iam.PolicyStatement(
+                actions=["cloudfront:CreateInvalidation"],
+                resources=[
+                    core.Stack.of(self).format_arn(
+                        service="cloudfront",
+                        region="",
+                        resource="distribution",
+                        resource_name=distribution.distribution_id)
+                ]))
+
+        provider = _cr.Provider(self,
+                                "SiteDeploymentProvider",
+                                on_event_handler=deployment_fn)
+
+        core.CustomResource(
+            self,
+            "SiteDeployment",
+            service_token=provider.service_token,
+            resource_type="Custom::StaticSiteDeployment",
+            properties={
+                "SourceBucketName":
+                site_asset.s3_bucket_name,
+                "SourceObjectKey":
+                site_asset.s3_object_key,
+                "DestinationBucketName":
+                source_bucket.bucket_name,
+                "ManifestKey":
+                ss.site_manifest_key,
+                "DistributionId":
+                distribution.distribution_id,
+                "RootObject":
+                ss.cfront_root_object,
+                "MaxInvalidationPaths":
+                str(ss.site_max_invalidation_paths),
+                "Prune":
+                str(ss.site_prune).lower(),
+            },
+        )
+
+    @staticmethod
+    def walk_build_dir(build_dir: str):
+        for root, _, files in os.walk(build_dir):
+            for name in sorted(files):
+                path = os.path.join(root, name)
+                yield os.path.relpath(path, build_dir).replace(os.sep,
+                                                               "/"), path
+
+    @staticmethod
+    def file_digest(path: str) -> str:
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    @staticmethod
+    def stage_file(path: str, target: str) -> None:
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        try:
+            os.link(path, target)
+        except OSError:
+            shutil.copy2(path, target)
+
+    @staticmethod
+    def write_manifest(path: str, body: str) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write(body)
@@ -0,0 +1,126 @@
+import json
+import os
+import tempfile
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
+
+import boto3
+
+s3 = boto3.client("s3")
+cloudfront = boto3.client("cloudfront")
+
+UPLOAD_WORKERS = 16
+
+
+def handler(event, context):
+    props = event["ResourceProperties"]
+    physical_id = event.get("PhysicalResourceId",
+                            props["DestinationBucketName"] + "-site")
+
+    # Objects are retained when the deployment is removed
+    if event["RequestType"] == "Delete":
+        return {"PhysicalResourceId": physical_id}
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        archive = os.path.join(work_dir, "site.zip")
+        s3.download_file(props["SourceBucketName"], props["SourceObjectKey"],
+                         archive)
+
+        with zipfile.ZipFile(archive) as site_zip:
+            new_manifest = json.loads(site_zip.read(props["ManifestKey"]))
+
+        old_manifest = load_deployed_manifest(props)
+
+        changed = [
+            key for key, entry in new_manifest.items()
+            if old_manifest.get(key, {}).get("hash") != entry["hash"]
+            or old_manifest[key].get("cache_control") != entry["cache_control"]
+        ]
+        removed = [key for key in old_manifest if key not in new_manifest]
+
+        with ThreadPoolExecutor(max_workers=UPLOAD_WORKERS) as pool:
+            list(
+                pool.map(lambda key: upload(archive, props, key,
+                                            new_manifest[key]), changed))
+
+        if removed and props.get("Prune") == "true":
+            delete(props["DestinationBucketName"], removed)
+
+        s3.put_object(Bucket=props["DestinationBucketName"],
+                      Key=props["ManifestKey"],
+                      Body=json.dumps(new_manifest).encode("utf-8"),
+                      ContentType="application/json",
+                      CacheControl="no-store")
+
+    # Content hashed objects never change under the same key. Paths are
+    # URL encoded the way CloudFront matches them against requests.
+    paths = sorted({
+        "/" + quote(key, safe="/~")
+        for key in changed + removed
+        if not (new_manifest.get(key) or old_manifest[key]).get(
+            "immutable", False)
+    })
+    if "/" + quote(props["RootObject"], safe="/~") in paths:
+        paths.append("/")
+    if paths and props.get("DistributionId"):
+        invalidate(props, paths, event["RequestId"])
+
+    print(f"uploaded {len(changed)}, removed {len(removed)}, "
+          f"invalidated {len(paths)} paths")
+    return {
+        "PhysicalResourceId": physical_id,
+        "Data": {
+            "Uploaded": len(changed),
+            "Removed": len(removed)
+        }
+    }
+
+
+def load_deployed_manifest(props):
+    try:
+        body = s3.get_object(Bucket=props["DestinationBucketName"],
+                             Key=props["ManifestKey"])["Body"]
+        return json.loads(body.read())
+    except s3.exceptions.NoSuchKey:
+        return {}
+
+
+def upload(archive, props, key, entry):
+    extra_args = {
+        "CacheControl": entry["cache_control"],
+        "ContentType": entry["content_type"],
+    }
+
+    # Members are streamed out of the archive, never read whole
+    with zipfile.ZipFile(archive) as site_zip:
+        with site_zip.open(key) as body:
+            s3.upload_fileobj(body,
+                              props["DestinationBucketName"],
+                              key,
+                              ExtraArgs=extra_args)
+
+
+def delete(bucket, keys):
+    for start in range(0, len(keys), 1000):
+        s3.delete_objects(Bucket=bucket,
+                          Delete={
+                              "Objects": [{
+                                  "Key": key
+                              } for key in keys[start:start + 1000]],
+                              "Quiet": True
+                          })
+
+
+def invalidate(props, paths, caller_reference):
+    if len(paths) > int(props["MaxInvalidationPaths"]):
+        paths = ["/*"]
+
+    cloudfront.create_invalidation(DistributionId=props["DistributionId"],
+                                   InvalidationBatch={
+                                       "Paths": {
+                                           "Quantity": len(paths),
+                                           "Items": paths
+                                       },
+                                       "CallerReference": caller_reference
+                                   })
@@ -21,7 +21,16 @@ setuptools.setup(
         "aws-cdk.aws-cloudfront-origins==1.95.1",
         "aws-cdk.aws-cloudwatch==1.95.1",
         "aws-cdk.aws-sqs==1.95.1",
-        "aws-cdk.aws-cloudwatch-actions==1.95.1"
+        "aws-cdk.aws-cloudwatch-actions==1.95.1",
+        "aws-cdk.aws-sns==1.95.1",
+        "aws-cdk.aws-applicationautoscaling==1.95.1",
+        "aws-cdk.aws-dax==1.95.1",
+        "aws-cdk.aws-ec2==1.95.1",
+        "aws-cdk.custom-resources==1.95.1",
+        "aws-cdk.aws-s3-assets==1.95.1",
+        "aws-cdk.aws-codedeploy==1.95.1",
+        "aws-cdk.aws-apigatewayv2==1.95.1",
+        "aws-cdk.aws-apigatewayv2-integrations==1.95.1"
             
     ],
     